@@ -3,15 +3,19 @@ Bitcoin Analytics Platform - REST API
 """
 import sys
 import os
+import json
+import time
+import asyncio
 import logging
 from typing import Dict, Any, Optional
 from datetime import datetime
-from fastapi import FastAPI, HTTPException, Request, status
+from fastapi import FastAPI, HTTPException, Query, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.openapi.docs import get_swagger_ui_html
 from fastapi.openapi.utils import get_openapi
 from pydantic import BaseModel
+from starlette.routing import Match
 
 # Configure detailed logging
 logging.basicConfig(
@@ -28,11 +32,26 @@ project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(project_root)
 
 # Import existing utilities and services
-from utils.data_fetcher import get_bitcoin_data, fetch_bitcoin_price, fetch_etf_data
-from utils.database import get_db_connection, init_db
+from utils.data_fetcher import (
+    get_bitcoin_data, fetch_bitcoin_price, fetch_etf_data, fetch_onchain_metrics,
+    refresh_bitcoin_history, PRICE_HISTORY_TTL, PRICE_HISTORY_WINDOW
+)
+from utils.database import get_db_connection, init_db, get_data_version, check_database, BitcoinPrice
+from utils.fingerprint import frame_fingerprint
+from utils.orderbook import OrderBook, DEFAULT_DEPTH_BPS
+from utils.correlation import align_series, correlation_report, DEFAULT_WINDOWS as CORRELATION_WINDOWS
 from utils.predictions import analyze_market_trends, generate_predictions
+from utils.ingestion import start_background_ingestion
+from utils.instrumentation import (
+    stage, current_route, observe_request, render_metrics, recent_profiles,
+    maybe_start_profiler, finish_profiler, PROMETHEUS_CONTENT_TYPE
+)
 from api.services.metrics import format_metrics, calculate_market_metrics
 from api.services.education import get_educational_content
+from api.services.concurrency import run_blocking, run_blocking_coalesced, shutdown_executors, DependencyBusyError
+from api.services.history import get_price_page, stream_price_ndjson, get_downsampled_prices
+from api.services.http_cache import make_etag, cache_headers, is_not_modified, not_modified_response
+from api.services.streaming import PriceBroadcaster, DROP_POLICIES, DROP_OLDEST
 
 # Response model
 class APIResponse(BaseModel):
@@ -40,6 +59,15 @@ class APIResponse(BaseModel):
     data: Optional[Any] = None
     error: Optional[str] = None
 
+class PaginatedResponse(APIResponse):
+    next_cursor: Optional[str] = None
+
+class TimedJSONResponse(JSONResponse):
+    """JSONResponse that records its encoding time as the serialization stage"""
+    def render(self, content: Any) -> bytes:
+        with stage("serialization", "json"):
+            return super().render(content)
+
 # Initialize FastAPI app with metadata
 app = FastAPI(
     title="Bitcoin Analytics Dashboard API",
@@ -50,6 +78,7 @@ app = FastAPI(
     version="1.0.0",
     docs_url=None,
     redoc_url=None,
+    default_response_class=TimedJSONResponse,
 )
 
 # Configure CORS
@@ -61,6 +90,36 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+def _route_template(request: Request) -> str:
+    """Path template of the route a request will hit, so metric labels stay bounded"""
+    for route in app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return getattr(route, "path", request.url.path)
+    return "unmatched"
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Time every request and label the stages it runs with its route
+
+    For streaming responses the duration covers producing the headers, not
+    the whole stream.
+    """
+    route = _route_template(request)
+    token = current_route.set(route)
+    profiler = maybe_start_profiler()
+    started = time.perf_counter()
+    status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        elapsed = time.perf_counter() - started
+        observe_request("api", route, request.method, status_code, elapsed)
+        finish_profiler(profiler, route, elapsed)
+        current_route.reset(token)
+
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
     """Handle HTTP exceptions"""
@@ -73,6 +132,20 @@ async def http_exception_handler(request: Request, exc: HTTPException):
         }
     )
 
+@app.exception_handler(DependencyBusyError)
+async def dependency_busy_handler(request: Request, exc: DependencyBusyError):
+    """Shed load when a dependency's thread pool is saturated"""
+    logger.warning(f"Rejecting request: {str(exc)}")
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={
+            "success": False,
+            "error": "Service busy, please retry",
+            "status_code": status.HTTP_503_SERVICE_UNAVAILABLE
+        },
+        headers={"Retry-After": "1"}
+    )
+
 @app.exception_handler(Exception)
 async def general_exception_handler(request: Request, exc: Exception):
     """Handle general exceptions"""
@@ -94,10 +167,21 @@ async def startup_event():
         if not init_db():
             raise Exception("Failed to initialize database")
         logger.info("Database initialized successfully")
+
+        # Keep market data current in the background instead of fetching per request
+        if os.getenv('INGESTION_MODE') == 'in_process':
+            start_background_ingestion()
+            logger.info("Background ingestion started")
     except Exception as e:
         logger.error(f"Startup error: {str(e)}")
         raise
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release worker threads on shutdown"""
+    await price_broadcaster.close()
+    shutdown_executors()
+
 @app.get("/docs", include_in_schema=False)
 async def custom_swagger_ui_html():
     """Custom Swagger UI endpoint"""
@@ -130,16 +214,28 @@ async def root():
 @app.get("/api/health", tags=["Health"])
 async def health_check():
     """Detailed health check endpoint"""
+    database = await run_blocking("database", check_database)
     return {
-        "status": "healthy",
+        "status": "healthy" if database["status"] == "connected" else "degraded",
         "timestamp": datetime.now().isoformat(),
         "services": {
-            "database": "connected",
+            "database": database["status"],
             "data_fetchers": "operational",
             "predictions": "operational"
-        }
+        },
+        "database": database
     }
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Request and stage latency histograms in Prometheus text format"""
+    return PlainTextResponse(render_metrics(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+@app.get("/metrics/profiles", include_in_schema=False)
+async def metrics_profiles():
+    """Collapsed stacks of the most recently profiled requests (PROFILE_SAMPLE_RATE)"""
+    return PlainTextResponse(recent_profiles())
+
 @app.get("/api/bitcoin/price", tags=["Bitcoin"], response_model=APIResponse)
 async def get_bitcoin_price():
     """
@@ -150,7 +246,7 @@ async def get_bitcoin_price():
     """
     try:
         logger.debug("Fetching Bitcoin price data...")
-        data = get_bitcoin_data()
+        data = await run_blocking_coalesced("upstream", get_bitcoin_data)
 
         if not data:
             raise HTTPException(
@@ -164,6 +260,8 @@ async def get_bitcoin_price():
 
         response_data = {**formatted_data, "market_metrics": market_metrics}
         return APIResponse(success=True, data=response_data)
+    except (HTTPException, DependencyBusyError):
+        raise
     except Exception as e:
         logger.error(f"Error fetching Bitcoin price: {str(e)}")
         raise HTTPException(
@@ -171,26 +269,130 @@ async def get_bitcoin_price():
             detail=str(e)
         )
 
-@app.get("/api/bitcoin/historical", tags=["Bitcoin"], response_model=APIResponse)
-async def get_historical_data():
+async def _fetch_price_update() -> Optional[Dict[str, Any]]:
+    """Current price payload for the live stream, same shape as /api/bitcoin/price"""
+    data = await run_blocking_coalesced("upstream", get_bitcoin_data)
+    if not data:
+        return None
+    return {**format_metrics(data), "market_metrics": calculate_market_metrics(data)}
+
+# One poller serves every open stream
+price_broadcaster = PriceBroadcaster(_fetch_price_update)
+STREAM_HEARTBEAT_SECONDS = 15
+
+@app.get("/api/bitcoin/price/stream", tags=["Bitcoin"])
+async def stream_bitcoin_price(
+    request: Request,
+    policy: str = Query(DROP_OLDEST, description=f"What to drop when this client falls behind: {', '.join(DROP_POLICIES)}")
+):
+    """
+    Stream live Bitcoin price updates as server-sent events
+
+    Returns:
+        text/event-stream with one `data:` event per price change, in the
+        /api/bitcoin/price data shape, and periodic keep-alive comments
+    """
+    if policy not in DROP_POLICIES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unsupported policy: {policy}"
+        )
+    subscription = price_broadcaster.subscribe(policy)
+
+    async def events():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    message = await subscription.get(timeout=STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if message is None:
+                    return
+                yield f"data: {message}\n\n"
+        finally:
+            price_broadcaster.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/api/bitcoin/historical", tags=["Bitcoin"], response_model=PaginatedResponse)
+async def get_historical_data(
+    request: Request,
+    response: Response,
+    start: Optional[datetime] = Query(None, description="First bar to include (default: one year ago)"),
+    end: Optional[datetime] = Query(None, description="Last bar to include"),
+    interval: str = Query("1d", description="Bar interval"),
+    limit: Optional[int] = Query(None, ge=1, le=10000, description="Bars per page (default 1000); caps the total when streaming"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    stream: bool = Query(False, description="Stream all matching bars as NDJSON instead of one page"),
+    max_points: Optional[int] = Query(None, ge=2, le=10000, description="Merge the whole range into at most this many bars (disables paging)")
+):
     """
     Get historical Bitcoin price data
 
     Returns:
-        JSON array of historical price data points
+        JSON array of historical price data points, with next_cursor set when
+        more bars follow; or, with stream=true, one JSON object per line.
+        With max_points the whole range comes back as one bounded array.
     """
     try:
+        if interval not in PRICE_HISTORY_TTL:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unsupported interval: {interval}"
+            )
+        if start is None and cursor is None:
+            start = datetime.utcnow() - PRICE_HISTORY_WINDOW
+
         logger.debug("Fetching historical Bitcoin data...")
-        data = fetch_bitcoin_price()
+        await run_blocking("upstream", refresh_bitcoin_history, interval)
+
+        # Read before the data, so a write in between can only make
+        # Last-Modified (the write time) older than the payload, never newer
+        version = await run_blocking("database", get_data_version, BitcoinPrice)
+        etag = make_etag("historical", version, str(request.url.query))
+        headers = cache_headers("historical", etag, version['last_modified'])
+        if is_not_modified(request, etag, version['last_modified']):
+            return not_modified_response(headers)
+
+        if max_points is not None:
+            historical_data = await run_blocking("database", get_downsampled_prices, start, end, max_points)
+            if stream:
+                return StreamingResponse(
+                    (json.dumps(record) + "\n" for record in historical_data),
+                    media_type="application/x-ndjson",
+                    headers=headers
+                )
+            response.headers.update(headers)
+            return PaginatedResponse(success=True, data=historical_data)
+
+        if stream:
+            # Starlette iterates the sync generator in its threadpool, one batch at a time
+            return StreamingResponse(
+                stream_price_ndjson(start, end, cursor, limit),
+                media_type="application/x-ndjson",
+                headers=headers
+            )
 
-        if data.empty:
+        historical_data, next_cursor = await run_blocking(
+            "database", get_price_page, start, end, cursor, limit or 1000
+        )
+        if not historical_data and cursor is None:
             raise HTTPException(
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                 detail="Historical data not available"
             )
 
-        historical_data = data.reset_index().to_dict('records')
-        return APIResponse(success=True, data=historical_data)
+        response.headers.update(headers)
+        return PaginatedResponse(success=True, data=historical_data, next_cursor=next_cursor)
+    except (HTTPException, DependencyBusyError):
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching historical data: {str(e)}")
         raise HTTPException(
@@ -199,7 +401,7 @@ async def get_historical_data():
         )
 
 @app.get("/api/bitcoin/analysis", tags=["Analysis"], response_model=APIResponse)
-async def get_market_analysis():
+async def get_market_analysis(request: Request, response: Response):
     """
     Get comprehensive market analysis including trends and predictions
 
@@ -208,8 +410,10 @@ async def get_market_analysis():
     """
     try:
         logger.debug("Generating market analysis...")
-        price_data = fetch_bitcoin_price()
-        onchain_data = fetch_onchain_metrics()
+        price_data, onchain_data = await asyncio.gather(
+            run_blocking_coalesced("upstream", fetch_bitcoin_price),
+            run_blocking_coalesced("database", fetch_onchain_metrics)
+        )
 
         if price_data.empty or onchain_data.empty:
             raise HTTPException(
@@ -217,13 +421,27 @@ async def get_market_analysis():
                 detail="Required data not available"
             )
 
-        analysis = analyze_market_trends(price_data, onchain_data)
+        # The analysis is a pure function of these two frames
+        etag = make_etag("analysis", *await asyncio.gather(
+            run_blocking("cpu", frame_fingerprint, price_data),
+            run_blocking("cpu", frame_fingerprint, onchain_data)
+        ))
+        # No Last-Modified: the newest bar is rewritten in place while it is
+        # forming, so its timestamp does not move when the data does
+        headers = cache_headers("analysis", etag, None)
+        if is_not_modified(request, etag, None):
+            return not_modified_response(headers)
+
+        analysis = await run_blocking("cpu", analyze_market_trends, price_data, onchain_data)
         predictions = generate_predictions()
 
+        response.headers.update(headers)
         return APIResponse(success=True, data={
             "analysis": analysis,
             "predictions": predictions
         })
+    except (HTTPException, DependencyBusyError):
+        raise
     except Exception as e:
         logger.error(f"Error generating analysis: {str(e)}")
         raise HTTPException(
@@ -232,7 +450,7 @@ async def get_market_analysis():
         )
 
 @app.get("/api/etf/data", tags=["ETF"], response_model=APIResponse)
-async def get_etf_data():
+async def get_etf_data(request: Request, response: Response):
     """
     Get Bitcoin ETF data including prices, volumes, and orderbook information
 
@@ -241,7 +459,7 @@ async def get_etf_data():
     """
     try:
         logger.debug("Fetching ETF data...")
-        data = fetch_etf_data()
+        data = await run_blocking_coalesced("upstream", fetch_etf_data, "1_year")
 
         if not data:
             raise HTTPException(
@@ -249,6 +467,16 @@ async def get_etf_data():
                 detail="ETF data not available"
             )
 
+        # The summary only depends on each ETF's history (the order book is derived from it)
+        fingerprints = await run_blocking(
+            "cpu", lambda: {etf: frame_fingerprint(etf_data['history']) for etf, etf_data in data.items()}
+        )
+        etag = make_etag("etf", sorted(fingerprints.items()))
+        # ETag only, for the same reason as the analysis endpoint
+        headers = cache_headers("etf", etag, None)
+        if is_not_modified(request, etag, None):
+            return not_modified_response(headers)
+
         etf_summary = {}
         for etf, etf_data in data.items():
             etf_summary[etf] = {
@@ -257,7 +485,10 @@ async def get_etf_data():
                 "orderbook": etf_data['orderbook']
             }
 
+        response.headers.update(headers)
         return APIResponse(success=True, data=etf_summary)
+    except (HTTPException, DependencyBusyError):
+        raise
     except Exception as e:
         logger.error(f"Error fetching ETF data: {str(e)}")
         raise HTTPException(
@@ -265,6 +496,126 @@ async def get_etf_data():
             detail=str(e)
         )
 
+@app.get("/api/correlation", tags=["Analysis"], response_model=APIResponse)
+async def get_correlation(
+    request: Request,
+    response: Response,
+    period: str = Query("1_year", description="ETF history to include: 1_week, 1_month, 3_months, 6_months or 1_year"),
+    windows: str = Query(",".join(str(window) for window in CORRELATION_WINDOWS), description="Comma-separated rolling windows in days"),
+    method: str = Query("price", description="Correlate daily prices or daily returns")
+):
+    """
+    Get the correlation matrix between Bitcoin and each ETF
+
+    Returns:
+        JSON object with the full-period correlation matrix and the latest
+        matrix for each rolling window, over days where every asset traded
+    """
+    try:
+        try:
+            window_sizes = sorted({int(window) for window in windows.split(",") if window.strip()})
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid windows: {windows}"
+            )
+        if method not in ("price", "returns"):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unsupported method: {method}"
+            )
+
+        price_data, etf_data = await asyncio.gather(
+            run_blocking_coalesced("upstream", fetch_bitcoin_price),
+            run_blocking_coalesced("upstream", fetch_etf_data, period)
+        )
+        if price_data.empty or not etf_data:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Required data not available"
+            )
+
+        series = {"BTC": price_data['Close']}
+        series.update({etf: data['history']['Close'] for etf, data in etf_data.items()})
+        fingerprints = await run_blocking(
+            "cpu", lambda: {name: frame_fingerprint(values.to_frame()) for name, values in series.items()}
+        )
+        etag = make_etag("correlation", sorted(fingerprints.items()), window_sizes, method)
+        # ETag only, for the same reason as the analysis endpoint
+        headers = cache_headers("correlation", etag, None)
+        if is_not_modified(request, etag, None):
+            return not_modified_response(headers)
+
+        report = await run_blocking(
+            # Tracked per period and method, so each request only applies the newest bars
+            "cpu", lambda: correlation_report(
+                align_series(series, method=method), window_sizes, track=("api", period, method)
+            )
+        )
+
+        response.headers.update(headers)
+        return APIResponse(success=True, data=report)
+    except (HTTPException, DependencyBusyError):
+        raise
+    except Exception as e:
+        logger.error(f"Error computing correlations: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+def _parse_number_list(value: Optional[str], name: str):
+    """Comma-separated positive numbers from a query parameter, or None if absent"""
+    if not value:
+        return None
+    try:
+        numbers = [float(item) for item in value.split(",") if item.strip()]
+    except ValueError:
+        numbers = []
+    if not numbers or any(number <= 0 for number in numbers):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid {name}: {value}"
+        )
+    return numbers
+
+@app.get("/api/etf/liquidity", tags=["ETF"], response_model=APIResponse)
+async def get_etf_liquidity(
+    sizes: Optional[str] = Query(None, description="Comma-separated order sizes for the slippage curve (default: fractions of the book)"),
+    depth_bps: str = Query(",".join(str(bps) for bps in DEFAULT_DEPTH_BPS), description="Comma-separated distances from the mid, in basis points")
+):
+    """
+    Get liquidity analytics for each Bitcoin ETF order book
+
+    Returns:
+        JSON object per ETF with spread, resting depth within each distance
+        of the mid, and buy/sell slippage for each order size
+    """
+    try:
+        order_sizes = _parse_number_list(sizes, "sizes")
+        distances = _parse_number_list(depth_bps, "depth_bps")
+
+        data = await run_blocking_coalesced("upstream", fetch_etf_data, "1_year")
+        if not data:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="ETF data not available"
+            )
+
+        liquidity = await run_blocking("cpu", lambda: {
+            etf: OrderBook.from_dict(etf_data['orderbook']).summary(order_sizes, distances)
+            for etf, etf_data in data.items()
+        })
+        return APIResponse(success=True, data=liquidity)
+    except (HTTPException, DependencyBusyError):
+        raise
+    except Exception as e:
+        logger.error(f"Error computing ETF liquidity: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
 @app.get("/api/education/content", tags=["Education"], response_model=APIResponse)
 async def get_education():
     """
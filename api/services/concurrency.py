@@ -0,0 +1,88 @@
+"""Concurrency service module for Bitcoin analytics platform
+
+Blocking calls (yfinance, SQLAlchemy, pandas) must not run on the event loop.
+Each dependency gets its own bounded thread pool, so a slow upstream cannot
+starve database reads or analytics. An admission limit per dependency caps
+how much work may queue up before requests are turned away with a 503.
+"""
+
+import os
+import time
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from utils.instrumentation import observe_stage
+from utils.singleflight import run_coalesced
+
+# Worker threads per dependency; override with CONCURRENCY_<NAME>
+DEPENDENCY_LIMITS: Dict[str, int] = {
+    "upstream": int(os.getenv("CONCURRENCY_UPSTREAM", "16")),
+    "database": int(os.getenv("CONCURRENCY_DATABASE", "10")),
+    "cpu": int(os.getenv("CONCURRENCY_CPU", str(os.cpu_count() or 2))),
+}
+
+# Calls admitted per dependency (running plus queued), as a multiple of its limit
+QUEUE_FACTOR = int(os.getenv("CONCURRENCY_QUEUE_FACTOR", "8"))
+
+# Seconds to wait for admission before giving up
+ADMISSION_TIMEOUT = float(os.getenv("CONCURRENCY_ADMISSION_TIMEOUT", "5"))
+
+_executors: Dict[str, ThreadPoolExecutor] = {
+    name: ThreadPoolExecutor(max_workers=limit, thread_name_prefix=f"{name}-worker")
+    for name, limit in DEPENDENCY_LIMITS.items()
+}
+_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+
+class DependencyBusyError(Exception):
+    """Raised when a dependency has no admission capacity left"""
+
+
+def _semaphore(dependency: str) -> asyncio.Semaphore:
+    # Created lazily so it binds to the running event loop
+    if dependency not in _semaphores:
+        _semaphores[dependency] = asyncio.Semaphore(DEPENDENCY_LIMITS[dependency] * QUEUE_FACTOR)
+    return _semaphores[dependency]
+
+
+async def run_blocking(dependency: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a blocking call in the dependency's thread pool and await its result"""
+    submitted = time.perf_counter()
+    semaphore = _semaphore(dependency)
+    try:
+        await asyncio.wait_for(semaphore.acquire(), timeout=ADMISSION_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise DependencyBusyError(f"Too many concurrent {dependency} calls")
+
+    try:
+        loop = asyncio.get_running_loop()
+        # Carry context variables into the worker thread, as asyncio.to_thread does
+        context = contextvars.copy_context()
+
+        def call():
+            # Time spent waiting for admission and a free worker, separate from the work itself
+            context.run(observe_stage, "queue_wait", dependency, time.perf_counter() - submitted)
+            return context.run(func, *args, **kwargs)
+
+        return await loop.run_in_executor(_executors[dependency], call)
+    finally:
+        semaphore.release()
+
+
+async def run_blocking_coalesced(dependency: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+    """run_blocking, with concurrent identical calls of a @single_flight function sharing one run
+
+    Waiting callers hold no worker thread or admission slot.
+    """
+    flight_key = getattr(func, "flight_key", None)
+    if flight_key is None:
+        return await run_blocking(dependency, func, *args, **kwargs)
+    return await run_coalesced(flight_key(*args, **kwargs), run_blocking, dependency, func, *args, **kwargs)
+
+
+def shutdown_executors() -> None:
+    """Stop all dependency thread pools"""
+    for executor in _executors.values():
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,98 @@
+"""Historical data service module for Bitcoin analytics platform"""
+
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from utils.database import PRICE_COLUMNS, iter_bitcoin_prices, load_bitcoin_prices_for_budget
+from utils.downsampling import downsample_ohlc
+
+# Rows read from the database per query when streaming
+STREAM_BATCH_SIZE = 1000
+
+
+def _to_naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Convert a request datetime to the naive UTC form stored in the database"""
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def encode_cursor(timestamp: datetime) -> str:
+    """Cursor pointing just after the given bar"""
+    return timestamp.isoformat()
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[datetime]:
+    """Timestamp of the last bar already returned, or None"""
+    if not cursor:
+        return None
+    try:
+        return _to_naive_utc(datetime.fromisoformat(cursor))
+    except ValueError:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+
+def serialize_price_row(row: Tuple) -> Dict[str, Any]:
+    """Convert a stored bar row to a JSON-ready dict"""
+    record = dict(zip(PRICE_COLUMNS, row))
+    record['Date'] = record['Date'].replace(tzinfo=timezone.utc).isoformat()
+    return record
+
+
+def get_price_page(
+    start: Optional[datetime],
+    end: Optional[datetime],
+    cursor: Optional[str],
+    limit: int
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Read one page of bars and the cursor for the next page (None on the last page)"""
+    # One extra row tells whether another page follows
+    rows = next(iter_bitcoin_prices(
+        start=_to_naive_utc(start),
+        end=_to_naive_utc(end),
+        after=decode_cursor(cursor),
+        batch_size=limit + 1
+    ), [])
+    next_cursor = encode_cursor(rows[limit - 1][0]) if len(rows) > limit else None
+    return [serialize_price_row(row) for row in rows[:limit]], next_cursor
+
+
+def stream_price_ndjson(
+    start: Optional[datetime],
+    end: Optional[datetime],
+    cursor: Optional[str],
+    limit: Optional[int]
+) -> Iterator[str]:
+    """Yield bars as newline-delimited JSON, reading the database in batches"""
+    remaining = limit
+    for rows in iter_bitcoin_prices(
+        start=_to_naive_utc(start),
+        end=_to_naive_utc(end),
+        after=decode_cursor(cursor),
+        batch_size=STREAM_BATCH_SIZE if limit is None else min(limit, STREAM_BATCH_SIZE)
+    ):
+        if remaining is not None:
+            rows = rows[:remaining]
+            remaining -= len(rows)
+        yield "".join(json.dumps(serialize_price_row(row)) + "\n" for row in rows)
+        if remaining == 0:
+            return
+
+
+def get_downsampled_prices(
+    start: Optional[datetime],
+    end: Optional[datetime],
+    max_points: int
+) -> List[Dict[str, Any]]:
+    """All bars in the range, merged into at most max_points OHLC bars
+
+    Long ranges are read from the rollup tables, so only the final merge
+    down to max_points happens here.
+    """
+    df, _ = load_bitcoin_prices_for_budget(start=_to_naive_utc(start), end=_to_naive_utc(end), max_points=max_points)
+    df = downsample_ohlc(df, max_points)
+    return [
+        serialize_price_row((timestamp.to_pydatetime(), *values))
+        for timestamp, values in zip(df.index, df[PRICE_COLUMNS[1:]].itertuples(index=False, name=None))
+    ]
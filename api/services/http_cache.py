@@ -0,0 +1,71 @@
+"""HTTP caching service module for Bitcoin analytics platform
+
+Endpoints derive a validator from the version of the data they serve and
+check it before doing the expensive work, so a client holding a current copy
+gets a 304 after a header exchange instead of a recomputed payload.
+"""
+
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+from fastapi import Request, Response, status
+
+# Cache-Control per endpoint: seconds fresh, then seconds a stale copy may be
+# served while the client revalidates in the background
+CACHE_POLICIES: Dict[str, Dict[str, int]] = {
+    "historical": {"max_age": 60, "stale_while_revalidate": 600},
+    "etf": {"max_age": 60, "stale_while_revalidate": 300},
+    "analysis": {"max_age": 300, "stale_while_revalidate": 900},
+    "correlation": {"max_age": 300, "stale_while_revalidate": 900},
+}
+
+
+def make_etag(*parts: Any) -> str:
+    """Strong ETag from the data version and anything else the payload depends on"""
+    return '"' + hashlib.sha1(repr(parts).encode()).hexdigest()[:20] + '"'
+
+
+def _as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def cache_headers(policy: str, etag: str, last_modified: Optional[datetime]) -> Dict[str, str]:
+    """Validator and Cache-Control headers for a response"""
+    settings = CACHE_POLICIES[policy]
+    headers = {
+        "ETag": etag,
+        "Cache-Control": (
+            f"public, max-age={settings['max_age']}, "
+            f"stale-while-revalidate={settings['stale_while_revalidate']}"
+        ),
+    }
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(_as_utc(last_modified), usegmt=True)
+    return headers
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    """Evaluate If-None-Match, falling back to If-Modified-Since when it is absent"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        # Weak comparison, as RFC 9110 requires for If-None-Match
+        return "*" in candidates or etag in [tag[2:] if tag.startswith("W/") else tag for tag in candidates]
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return _as_utc(last_modified).replace(microsecond=0) <= _as_utc(since)
+    return False
+
+
+def not_modified_response(headers: Dict[str, str]) -> Response:
+    """Empty 304 response carrying the current validators"""
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
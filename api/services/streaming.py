@@ -0,0 +1,125 @@
+"""Live price streaming service module for Bitcoin analytics platform
+
+One poller fetches the current price and publishes each change once. The
+pre-serialized update is then fanned out to every subscriber's bounded
+queue. A subscriber that falls behind loses updates according to its drop
+policy, and never slows the poller or the other subscribers.
+"""
+
+import os
+import json
+import asyncio
+import logging
+from typing import Any, Callable, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = float(os.getenv("PRICE_STREAM_POLL_INTERVAL", "5"))
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("PRICE_STREAM_QUEUE_SIZE", "16"))
+
+# What to do when a subscriber's queue is full
+DROP_OLDEST = "drop_oldest"    # discard the oldest queued update (default: latest price wins)
+DROP_NEWEST = "drop_newest"    # discard the incoming update
+DISCONNECT = "disconnect"      # close the subscription
+DROP_POLICIES = (DROP_OLDEST, DROP_NEWEST, DISCONNECT)
+
+
+class Subscription:
+    """A subscriber's bounded queue of serialized updates"""
+
+    def __init__(self, policy: str = DROP_OLDEST, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        if policy not in DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy: {policy}")
+        self.policy = policy
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.closed = False
+
+    def offer(self, message: str) -> None:
+        """Enqueue without waiting, applying the drop policy when full"""
+        if self.closed:
+            return
+        if self.queue.full():
+            self.dropped += 1
+            if self.policy == DROP_NEWEST:
+                return
+            if self.policy == DISCONNECT:
+                self.close()
+                return
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+    def close(self) -> None:
+        self.closed = True
+        # Wake a consumer waiting on get(); None marks the end of the stream
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[str]:
+        """Next update, None once closed; raises asyncio.TimeoutError after timeout"""
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class PriceBroadcaster:
+    """Polls one upstream source while anyone is subscribed and fans updates out"""
+
+    def __init__(self, fetch: Callable[[], Any], poll_interval: float = POLL_INTERVAL):
+        # fetch is an async callable returning a JSON-serializable update, or None
+        self.fetch = fetch
+        self.poll_interval = poll_interval
+        self.subscribers: Set[Subscription] = set()
+        self.latest: Optional[str] = None
+        self.published = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, policy: str = DROP_OLDEST, queue_size: int = SUBSCRIBER_QUEUE_SIZE) -> Subscription:
+        subscription = Subscription(policy, queue_size)
+        if self.latest is not None:
+            subscription.offer(self.latest)
+        self.subscribers.add(subscription)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._poll())
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self.subscribers.discard(subscription)
+        subscription.closed = True
+
+    def publish(self, update: Any) -> None:
+        """Serialize once and offer to every subscriber"""
+        message = json.dumps(update, default=str)
+        if message == self.latest:
+            return
+        self.latest = message
+        self.published += 1
+        for subscription in list(self.subscribers):
+            subscription.offer(message)
+            if subscription.closed:
+                self.subscribers.discard(subscription)
+
+    async def _poll(self) -> None:
+        while self.subscribers:
+            try:
+                update = await self.fetch()
+                if update is not None:
+                    self.publish(update)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Price stream poll failed: {str(e)}")
+            await asyncio.sleep(self.poll_interval)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "subscribers": len(self.subscribers),
+            "published": self.published,
+            "dropped": sum(subscription.dropped for subscription in self.subscribers),
+        }
+
+    async def close(self) -> None:
+        for subscription in list(self.subscribers):
+            subscription.close()
+        self.subscribers.clear()
+        if self._task is not None:
+            self._task.cancel()
@@ -0,0 +1 @@
+"""Offline micro-benchmarks for the data, storage, analytics and rendering hot paths"""
@@ -0,0 +1,199 @@
+"""Benchmark runner
+
+    python -m benchmarks run [--sizes 1k,100k,1m] [--only analyze_market_trends,...] [--out FILE]
+    python -m benchmarks compare BASELINE.json CURRENT.json [--threshold 0.1]
+    python -m benchmarks list
+
+run times every benchmark at every size on synthetic data. It writes the
+timings and the environment to JSON, by default under benchmarks/results/.
+Unless --database-url is given, the database benchmarks use a throwaway
+SQLite file. compare matches results by benchmark and size, and exits 1
+when a median got slower by more than the threshold.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+from datetime import datetime, timezone
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(PROJECT_ROOT, 'benchmarks', 'results')
+DEFAULT_SIZES = '1k,10k,100k'
+DEFAULT_THRESHOLD = 0.10  # fractional slowdown of the median flagged as a regression
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT, capture_output=True, text=True
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def _environment():
+    import numpy
+    import pandas
+    import sqlalchemy
+    from utils import database
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': numpy.__version__,
+        'pandas': pandas.__version__,
+        'sqlalchemy': sqlalchemy.__version__,
+        'database': database.get_engine().dialect.name,
+    }
+
+
+def time_benchmark(name, rows, repeat, force=False):
+    """Timings in seconds for one benchmark at one size, or None if skipped"""
+    from benchmarks.suite import BENCHMARKS
+    spec = BENCHMARKS[name]
+    if spec['max_rows'] is not None and rows > spec['max_rows'] and not force:
+        return None
+
+    setup, run = spec['factory'](rows)
+    args = setup()
+    run(*args)  # warm-up: imports, caches, JIT-free but first-call effects
+    times = []
+    for _ in range(repeat):
+        if spec['per_iteration_setup']:
+            args = setup()
+        started = time.perf_counter()
+        run(*args)
+        times.append(time.perf_counter() - started)
+
+    median = statistics.median(times)
+    return {
+        'name': name,
+        'rows': rows,
+        'times': times,
+        'min': min(times),
+        'median': median,
+        'mean': statistics.fmean(times),
+        'stdev': statistics.stdev(times) if len(times) > 1 else 0.0,
+        'rows_per_second': rows / median if median else None,
+    }
+
+
+def run(args):
+    from benchmarks import synthetic
+    from benchmarks.suite import BENCHMARKS
+
+    names = args.only.split(',') if args.only else list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        raise SystemExit(f"Unknown benchmarks: {', '.join(unknown)}")
+    sizes = [synthetic.parse_rows(size) for size in args.sizes.split(',')]
+
+    results = []
+    for name in names:
+        for rows in sizes:
+            # Large inputs get fewer repeats so a full run stays in minutes
+            repeat = args.repeat or (5 if rows <= 100_000 else 3 if rows <= 1_000_000 else 1)
+            result = time_benchmark(name, rows, repeat, args.force)
+            if result is None:
+                print(f"{name:<24} {synthetic.format_rows(rows):>6}  skipped (over max_rows; use --force)")
+                continue
+            results.append(result)
+            print(
+                f"{name:<24} {synthetic.format_rows(rows):>6}  "
+                f"median {result['median'] * 1000:10.2f} ms  min {result['min'] * 1000:10.2f} ms  "
+                f"({result['rows_per_second']:,.0f} rows/s)"
+            )
+
+    out = args.out or os.path.join(
+        RESULTS_DIR, datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ') + '.json'
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump({'environment': _environment(), 'results': results}, f, indent=2)
+    print(f"\nWrote {out}")
+    return 0
+
+
+def compare(args):
+    from benchmarks import synthetic
+
+    def load(path):
+        with open(path) as f:
+            return {(r['name'], r['rows']): r for r in json.load(f)['results']}
+
+    baseline, current = load(args.baseline), load(args.current)
+    regressions = 0
+    for key in sorted(set(baseline) & set(current)):
+        ratio = current[key]['median'] / baseline[key]['median']
+        status = ''
+        if ratio > 1 + args.threshold:
+            status = 'REGRESSION'
+            regressions += 1
+        elif ratio < 1 - args.threshold:
+            status = 'faster'
+        name, rows = key
+        print(
+            f"{name:<24} {synthetic.format_rows(rows):>6}  "
+            f"{baseline[key]['median'] * 1000:10.2f} ms -> {current[key]['median'] * 1000:10.2f} ms  "
+            f"x{ratio:5.2f}  {status}"
+        )
+    for key in sorted(set(baseline) ^ set(current)):
+        print(f"{key[0]:<24} {synthetic.format_rows(key[1]):>6}  only in {'baseline' if key in baseline else 'current'}")
+
+    print(f"\n{regressions} regression(s) beyond {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="Run the benchmarks and write JSON results")
+    run_parser.add_argument('--sizes', default=DEFAULT_SIZES, help="Comma-separated row counts, e.g. 1k,100k,10m")
+    run_parser.add_argument('--only', help="Comma-separated benchmark names")
+    run_parser.add_argument('--repeat', type=int, help="Timed runs per benchmark and size")
+    run_parser.add_argument('--out', help="Result file (default: benchmarks/results/<timestamp>.json)")
+    run_parser.add_argument(
+        '--database-url',
+        help="Dedicated database to benchmark against; its tables are dropped and recreated (default: temporary SQLite file)"
+    )
+    run_parser.add_argument('--force', action='store_true', help="Also run sizes above a benchmark's max_rows")
+
+    compare_parser = commands.add_parser('compare', help="Compare two result files")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+
+    commands.add_parser('list', help="List the benchmarks")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, PROJECT_ROOT)
+    logging.basicConfig(level=logging.WARNING)
+
+    if args.command == 'list':
+        from benchmarks.suite import BENCHMARKS
+        for name, spec in BENCHMARKS.items():
+            print(name + (f"  (max {spec['max_rows']:,} rows)" if spec['max_rows'] else ''))
+        return 0
+    if args.command == 'compare':
+        return compare(args)
+
+    if args.database_url and args.database_url == os.getenv('DATABASE_URL'):
+        raise SystemExit("Refusing to benchmark against the application's DATABASE_URL; its tables would be dropped")
+
+    with tempfile.TemporaryDirectory(prefix='bitcoin-analytics-bench-') as scratch:
+        # Must be set before the engine is first used
+        os.environ['DATABASE_URL'] = args.database_url or 'sqlite:///' + os.path.join(scratch, 'bench.db')
+        return run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""Benchmark definitions for the data, storage, analytics and rendering hot paths
+
+Each benchmark takes a row count and returns (setup, run). setup is untimed
+and returns the arguments run is called with. max_rows skips sizes that
+would take minutes on a laptop (mostly database writes); --force runs them
+anyway.
+"""
+from benchmarks import synthetic
+
+BENCHMARKS = {}
+
+
+def benchmark(name, max_rows=None, per_iteration_setup=False):
+    """Register a benchmark factory under name
+
+    per_iteration_setup re-runs setup before every timed run, for benchmarks
+    that change state (such as inserting rows into an empty table).
+    """
+    def register(factory):
+        BENCHMARKS[name] = {
+            'factory': factory,
+            'max_rows': max_rows,
+            'per_iteration_setup': per_iteration_setup,
+        }
+        return factory
+    return register
+
+
+def _reset_tables():
+    from utils import database
+    engine = database.get_engine()
+    database.Base.metadata.drop_all(bind=engine)
+    database.Base.metadata.create_all(bind=engine)
+
+
+@benchmark('store_bitcoin_price', max_rows=1_000_000, per_iteration_setup=True)
+def store_bitcoin_price(rows):
+    from utils.database import store_bitcoin_price as store
+    frame = synthetic.ohlcv_frame(rows)
+
+    def setup():
+        _reset_tables()
+        return (frame,)
+    return setup, store
+
+
+@benchmark('store_onchain_metrics', max_rows=1_000_000, per_iteration_setup=True)
+def store_onchain_metrics(rows):
+    from utils.database import store_onchain_metrics as store
+    frame = synthetic.onchain_frame(rows)
+
+    def setup():
+        _reset_tables()
+        return (frame,)
+    return setup, store
+
+
+@benchmark('get_historical_metrics', max_rows=1_000_000)
+def get_historical_metrics(rows):
+    from utils.database import store_onchain_metrics
+    from utils.data_fetcher import get_historical_metrics as read
+
+    def setup():
+        _reset_tables()
+        store_onchain_metrics(synthetic.onchain_frame(rows))
+        return ()
+    return setup, read
+
+
+@benchmark('analyze_market_trends')
+def analyze_market_trends(rows):
+    from utils.predictions import analyze_market_trends as analyze
+    prices, onchain = synthetic.ohlcv_frame(rows), synthetic.onchain_frame(rows)
+    return (lambda: (prices, onchain)), analyze
+
+
+def _cold_render(renderer):
+    """Call a memoized renderer with its cache emptied, so the render itself is timed"""
+    from utils import visualizations
+
+    def run(*args):
+        visualizations._render_cache.clear()
+        return renderer(*args)
+    return run
+
+
+@benchmark('create_price_chart')
+def create_price_chart(rows):
+    from utils.visualizations import create_price_chart as render
+    frame = synthetic.ohlcv_frame(rows)
+    return (lambda: (frame,)), _cold_render(render)
+
+
+@benchmark('create_metric_chart')
+def create_metric_chart(rows):
+    from utils.visualizations import create_metric_chart as render
+    frame = synthetic.onchain_frame(rows)
+    return (lambda: (frame, 'hash_rate')), _cold_render(render)
+
+
+@benchmark('create_etf_comparison', max_rows=3_000_000)  # rows per ETF, three ETFs
+def create_etf_comparison(rows):
+    from utils.visualizations import create_etf_comparison as render
+    data = synthetic.etf_data(rows)
+    return (lambda: (data,)), _cold_render(render)
+
+
+@benchmark('format_metrics')
+def format_metrics(rows):
+    """rows calls of format_metrics and calculate_market_metrics on distinct snapshots"""
+    from api.services.metrics import format_metrics as format_, calculate_market_metrics
+    snapshots = [synthetic.price_snapshot(seed) for seed in range(min(rows, 1000))]
+
+    def run(snapshots):
+        for i in range(rows):
+            snapshot = snapshots[i % len(snapshots)]
+            format_(snapshot)
+            calculate_market_metrics(snapshot)
+    return (lambda: (snapshots,)), run
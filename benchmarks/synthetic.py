@@ -0,0 +1,74 @@
+"""Synthetic, reproducible inputs for the benchmarks
+
+Frames have the same shape and column names as the ones the app builds from
+yfinance and the database, so every benchmark exercises the real code path
+with no network access.
+"""
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+START = pd.Timestamp('2015-01-01', tz='UTC')
+
+
+def parse_rows(value):
+    """'1k' / '250K' / '10m' / '5000' -> number of rows"""
+    value = str(value).strip().lower()
+    multiplier = {'k': 1_000, 'm': 1_000_000}.get(value[-1:], 1)
+    digits = value[:-1] if multiplier != 1 else value
+    return int(float(digits) * multiplier)
+
+
+def format_rows(rows):
+    for suffix, size in (('m', 1_000_000), ('k', 1_000)):
+        if rows >= size and rows % size == 0:
+            return f"{rows // size}{suffix}"
+    return str(rows)
+
+
+def ohlcv_frame(rows, freq='min', seed=0, price=30_000.0):
+    """Geometric random-walk OHLCV bars indexed by UTC timestamp"""
+    rng = np.random.default_rng(seed)
+    close = price * np.exp(np.cumsum(rng.normal(0, 0.001, rows)))
+    open_ = np.concatenate(([price], close[:-1]))
+    spread = np.abs(rng.normal(0, 0.0005, rows)) * close
+    return pd.DataFrame({
+        'Open': open_,
+        'High': np.maximum(open_, close) + spread,
+        'Low': np.minimum(open_, close) - spread,
+        'Close': close,
+        'Volume': rng.gamma(2.0, 5e8, rows),
+    }, index=pd.date_range(START, periods=rows, freq=freq, name='Date'))
+
+
+def onchain_frame(rows, freq='min', seed=1):
+    """On-chain metrics indexed by naive timestamp, as fetch_onchain_metrics returns them"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'active_addresses': rng.integers(800_000, 1_200_000, rows),
+        'transaction_volume': rng.uniform(1e9, 5e9, rows),
+        'hash_rate': rng.uniform(300, 500, rows),
+    }, index=pd.date_range(START.tz_localize(None), periods=rows, freq=freq, name='timestamp'))
+
+
+def etf_data(rows, symbols=('BITO', 'BITI', 'BTF'), seed=2):
+    """{symbol: {'history', 'orderbook'}} as fetch_etf_data returns it"""
+    from utils.data_fetcher import _simulated_orderbook
+
+    data = {}
+    for offset, symbol in enumerate(symbols):
+        history = ohlcv_frame(rows, seed=seed + offset, price=20.0)
+        data[symbol] = {'history': history, 'orderbook': _simulated_orderbook(history)}
+    return data
+
+
+def price_snapshot(seed=3):
+    """Current-price dict as get_bitcoin_data returns it"""
+    rng = np.random.default_rng(seed)
+    return {
+        'price': float(rng.uniform(20_000, 100_000)),
+        'change_24h': float(rng.normal(0, 3)),
+        'volume': float(rng.uniform(1e10, 5e10)),
+        'timestamp': datetime.now(timezone.utc).replace(tzinfo=None).isoformat(),
+    }
@@ -1,4 +1,5 @@
-from flask import Flask, render_template, jsonify, send_from_directory
+from flask import Flask, Response, g, request, jsonify, send_from_directory
+from flask import render_template as flask_render_template
 import pandas as pd
 from utils.data_fetcher import (
     get_bitcoin_data,
@@ -12,10 +13,16 @@ from utils.visualizations import (
     create_etf_comparison
 )
 from utils.sitemap import generate_sitemap, write_sitemap
+from utils.ingestion import start_background_ingestion
 from utils.predictions import analyze_market_trends, generate_predictions # Fixed import path
+from utils.instrumentation import (
+    stage, current_route, observe_request, render_metrics, recent_profiles,
+    maybe_start_profiler, finish_profiler, PROMETHEUS_CONTENT_TYPE
+)
 import logging
 import os
 import json
+import time
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -26,6 +33,39 @@ app = Flask(__name__)
 # Add sum function to Jinja context
 app.jinja_env.globals.update(sum=sum)
 
+# Keep market data current in the background instead of fetching per request
+if os.getenv('INGESTION_MODE') == 'in_process':
+    start_background_ingestion()
+
+def render_template(template_name, **context):
+    """Render a page, timed as the serialization stage"""
+    with stage('serialization', 'jinja'):
+        return flask_render_template(template_name, **context)
+
+@app.before_request
+def start_request_metrics():
+    """Label this request's stages with its route template and start its timer"""
+    g.metrics_route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    g.metrics_token = current_route.set(g.metrics_route)
+    g.metrics_profiler = maybe_start_profiler()
+    g.metrics_started = time.perf_counter()
+
+@app.after_request
+def record_response_status(response):
+    g.metrics_status = response.status_code
+    return response
+
+@app.teardown_request
+def finish_request_metrics(exc):
+    """Record the request duration; runs for failed requests too"""
+    if 'metrics_started' not in g:
+        return
+    elapsed = time.perf_counter() - g.metrics_started
+    status = g.get('metrics_status', 500)
+    observe_request('dashboard', g.metrics_route, request.method, status, elapsed)
+    finish_profiler(g.metrics_profiler, g.metrics_route, elapsed)
+    current_route.reset(g.metrics_token)
+
 # Flag to track if sitemap has been generated
 _sitemap_generated = False
 
@@ -75,7 +115,7 @@ def index():
         if not price_chart:
             logger.warning("No historical price data available")
 
-        etf_data = fetch_etf_data()
+        etf_data = fetch_etf_data(period='1_year')
         etf_chart = create_etf_comparison(etf_data) if etf_data else None
         if not etf_chart:
             logger.warning("No ETF data available")
@@ -106,7 +146,7 @@ def correlation():
     """Correlation analysis page"""
     try:
         historical_data = fetch_bitcoin_price()
-        etf_data = fetch_etf_data()
+        etf_data = fetch_etf_data(period='1_year')
         return render_template('correlation.html',
             price_chart=create_price_chart(historical_data) if not historical_data.empty else None,
             etf_chart=create_etf_comparison(etf_data) if etf_data else None
@@ -119,7 +159,7 @@ def correlation():
 def liquidity():
     """Liquidity analysis page"""
     try:
-        etf_data = fetch_etf_data()
+        etf_data = fetch_etf_data(period='1_year')
         logger.info(f"Fetched ETF data: {etf_data}")  # Add logging
         if not etf_data:
             return render_template('liquidity.html', error="Unable to fetch ETF data")
@@ -170,6 +210,16 @@ def risk_metrics():
     """Risk metrics and alerts page"""
     return render_template('risk_metrics.html')
 
+@app.route('/metrics')
+def metrics():
+    """Request and stage latency histograms in Prometheus text format"""
+    return Response(render_metrics(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+@app.route('/metrics/profiles')
+def metrics_profiles():
+    """Collapsed stacks of the most recently profiled requests (PROFILE_SAMPLE_RATE)"""
+    return Response(recent_profiles(), content_type='text/plain; charset=utf-8')
+
 @app.route('/health')
 def health_check():
     """Simple health check endpoint"""
@@ -2,6 +2,7 @@ import streamlit as st
 import pandas as pd
 from utils.data_fetcher import fetch_bitcoin_price, fetch_etf_data
 from utils.visualizations import create_etf_comparison
+from utils.correlation import align_series, correlation_matrix, rolling_correlations, DEFAULT_WINDOWS
 
 st.set_page_config(page_title="Correlation Analysis", page_icon="📊")
 
@@ -9,27 +10,35 @@ st.title("Bitcoin & ETF Correlation Analysis")
 
 # Fetch data
 btc_data = fetch_bitcoin_price()
-etf_data = fetch_etf_data()
+etf_data = fetch_etf_data(period='1_year')
 
 if not btc_data.empty and etf_data:
     # Display correlation metrics
     st.subheader("Price Correlation")
     
-    # Calculate correlation between BTC and ETF prices
-    for etf, data in etf_data.items():
-        if not data['history'].empty:
-            # Resample both series to daily and align dates
-            btc_daily = btc_data['Close'].resample('D').last()
-            etf_daily = data['history']['Close'].resample('D').last()
-            
-            # Calculate correlation on aligned data
-            corr = btc_daily.corr(etf_daily)
-            
-            st.metric(
-                f"BTC-{etf} Correlation",
-                f"{corr:.2%}",
-                help=f"Price correlation between Bitcoin and {etf}"
-            )
+    # Align BTC and every ETF on shared days once, then correlate all pairs together
+    prices = align_series({
+        'BTC': btc_data['Close'],
+        **{etf: data['history']['Close'] for etf, data in etf_data.items() if not data['history'].empty}
+    })
+    matrix = pd.DataFrame(correlation_matrix(prices.to_numpy()), index=prices.columns, columns=prices.columns)
+
+    for etf in matrix.columns.drop('BTC', errors='ignore'):
+        st.metric(
+            f"BTC-{etf} Correlation",
+            f"{matrix.loc['BTC', etf]:.2%}",
+            help=f"Price correlation between Bitcoin and {etf}"
+        )
+
+    st.dataframe(matrix.style.format("{:.2f}"), use_container_width=True)
+
+    # Every day's matrix for the window comes from one pass over cumulative sums
+    st.subheader("Rolling Correlation with BTC")
+    window = st.selectbox("Window (days)", DEFAULT_WINDOWS, index=1)
+    rolling = rolling_correlations(prices.to_numpy(), (window,))[window]
+    btc_column = prices.columns.get_loc('BTC')
+    history = pd.DataFrame(rolling[:, btc_column, :], index=prices.index, columns=prices.columns)
+    st.line_chart(history.drop(columns='BTC').dropna(how='all'))
 
     # Show comparison chart
     st.subheader("Price Comparison")
@@ -1,6 +1,8 @@
 import streamlit as st
+import numpy as np
 import plotly.graph_objects as go
 from utils.data_fetcher import fetch_etf_data
+from utils.orderbook import OrderBook
 
 st.set_page_config(page_title="Liquidity Analysis", page_icon="💧")
 
@@ -51,10 +53,26 @@ if etf_data:
 
         st.plotly_chart(fig, use_container_width=True)
 
-        col1, col2 = st.columns(2)
+        book = OrderBook.from_dict(data['orderbook'])
+        col1, col2, col3 = st.columns(3)
         with col1:
-            st.metric("Total Bid Volume", f"${sum(data['orderbook']['bid_volumes']):,.0f}")
+            st.metric("Total Bid Volume", f"${book.total_bid_size:,.0f}")
         with col2:
-            st.metric("Total Ask Volume", f"${sum(data['orderbook']['ask_volumes']):,.0f}")
+            st.metric("Total Ask Volume", f"${book.total_ask_size:,.0f}")
+        with col3:
+            st.metric("Spread", f"{book.spread_bps:,.0f} bps")
+
+        # Execution cost of market orders up to the thinner side's full depth
+        curve = book.slippage_curve(np.linspace(0, min(book.total_bid_size, book.total_ask_size), 50)[1:])
+        cost_fig = go.Figure()
+        cost_fig.add_trace(go.Scatter(x=curve['sizes'], y=curve['buy_bps'], name='Buy', line=dict(color='rgba(255, 80, 0, 0.9)')))
+        cost_fig.add_trace(go.Scatter(x=curve['sizes'], y=curve['sell_bps'], name='Sell', line=dict(color='rgba(33, 206, 153, 0.9)')))
+        cost_fig.update_layout(
+            title=f"{etf} Slippage by Order Size",
+            xaxis_title="Order Size",
+            yaxis_title="Slippage vs Mid (bps)",
+            template='plotly_white'
+        )
+        st.plotly_chart(cost_fig, use_container_width=True)
 else:
     st.warning("Unable to fetch ETF data for liquidity analysis.")
\ No newline at end of file
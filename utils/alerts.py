@@ -1,28 +1,26 @@
-import os
 import logging
+import itertools
 from datetime import datetime
-from twilio.rest import Client
+import numpy as np
+from utils.notifications import TwilioTransport, TransportError
+
+# One transport, and so one Twilio client, for every synchronous send
+_transport = None
+
+def _get_transport():
+    global _transport
+    if _transport is None:
+        _transport = TwilioTransport()
+    return _transport
 
 def send_alert(phone_number: str, message: str) -> dict:
     """Send SMS alert using Twilio"""
     try:
-        account_sid = os.environ.get('TWILIO_ACCOUNT_SID')
-        auth_token = os.environ.get('TWILIO_AUTH_TOKEN')
-        from_number = os.environ.get('TWILIO_PHONE_NUMBER')
-
-        if not all([account_sid, auth_token, from_number]):
-            logging.error("Twilio credentials not configured")
-            return {"success": False, "error": "Twilio credentials not configured"}
-
-        client = Client(account_sid, auth_token)
-
-        message = client.messages.create(
-            body=message,
-            from_=from_number,
-            to=phone_number
-        )
-
-        return {"success": True, "message_sid": message.sid}
+        message_sid = _get_transport().send(phone_number, message)
+        return {"success": True, "message_sid": message_sid}
+    except TransportError as e:
+        logging.error(str(e))
+        return {"success": False, "error": str(e)}
     except Exception as e:
         logging.error(f"Failed to send alert: {str(e)}")
         return {"success": False, "error": str(e)}
@@ -34,9 +32,14 @@ def check_alert_conditions(
     volatility_threshold: float,
     current_drawdown: float,
     drawdown_threshold: float,
-    phone_number: str
+    phone_number: str,
+    dispatcher=None
 ) -> dict:
-    """Check if alert conditions are met and send notifications"""
+    """Check if alert conditions are met and send notifications
+
+    With a NotificationDispatcher the notification is queued and this returns
+    without waiting for delivery.
+    """
     alerts = []
 
     if current_price <= price_threshold:
@@ -48,6 +51,10 @@ def check_alert_conditions(
     if current_drawdown * 100 <= -drawdown_threshold:
         alerts.append(f"Drawdown Alert: Current drawdown is {current_drawdown*100:.2f}%")
 
+    if alerts and phone_number and dispatcher is not None:
+        queued = all([dispatcher.submit(phone_number, alert) for alert in alerts])
+        return {"success": queued, "alerts": alerts, "queued": queued}
+
     if alerts and phone_number:
         message = "\n".join(alerts)
         result = send_alert(phone_number, message)
@@ -60,7 +67,7 @@ def check_alert_conditions(
 
     return {"success": True, "alerts": alerts}
 
-def check_price_alerts(price_data: dict, phone_number: str = None) -> dict:
+def check_price_alerts(price_data: dict, phone_number: str = None, dispatcher=None) -> dict:
     """Check price alerts and send notifications if conditions are met"""
     try:
         current_price = price_data.get('price', 0)
@@ -71,39 +78,145 @@ def check_price_alerts(price_data: dict, phone_number: str = None) -> dict:
             volatility_threshold=10,  # Example threshold (10%)
             current_drawdown=-0.1,  # Example drawdown
             drawdown_threshold=20,  # Example threshold (20%)
-            phone_number=phone_number
+            phone_number=phone_number,
+            dispatcher=dispatcher
         )
     except Exception as e:
         logging.error(f"Error checking price alerts: {str(e)}")
         return {"success": False, "error": str(e)}
-import json
-from datetime import datetime
+ALERT_CONDITIONS = ('above', 'below')
+
+class _ThresholdIndex:
+    """Alert thresholds for one metric and condition, kept as sorted arrays
+
+    New and removed alerts are buffered and merged in on the next evaluation,
+    so bulk changes cost one sort instead of one array rebuild each.
+    """
+
+    def __init__(self):
+        self.thresholds = np.empty(0, dtype='float64')
+        self.ids = np.empty(0, dtype='int64')
+        self._pending_thresholds = []
+        self._pending_ids = []
+        self._removed = set()
+
+    def add(self, threshold, alert_id):
+        self._pending_thresholds.append(threshold)
+        self._pending_ids.append(alert_id)
+
+    def remove(self, alert_id):
+        self._removed.add(alert_id)
+
+    def _compact(self):
+        if self._pending_ids:
+            self.thresholds = np.concatenate((self.thresholds, np.asarray(self._pending_thresholds, dtype='float64')))
+            self.ids = np.concatenate((self.ids, np.asarray(self._pending_ids, dtype='int64')))
+            order = np.argsort(self.thresholds, kind='stable')
+            self.thresholds, self.ids = self.thresholds[order], self.ids[order]
+            self._pending_thresholds = []
+            self._pending_ids = []
+        if self._removed:
+            keep = ~np.isin(self.ids, np.fromiter(self._removed, dtype='int64'))
+            self.thresholds, self.ids = self.thresholds[keep], self.ids[keep]
+            self._removed = set()
+
+    def __len__(self):
+        self._compact()
+        return len(self.ids)
+
+    def above(self, value):
+        """Ids whose threshold is below value"""
+        self._compact()
+        return self.ids[:np.searchsorted(self.thresholds, value, 'left')]
+
+    def below(self, value):
+        """Ids whose threshold is above value"""
+        self._compact()
+        return self.ids[np.searchsorted(self.thresholds, value, 'right'):]
+
+    def crossed_up(self, previous, value):
+        """Ids with previous <= threshold < value"""
+        self._compact()
+        lo = np.searchsorted(self.thresholds, previous, 'left')
+        hi = np.searchsorted(self.thresholds, value, 'left')
+        return self.ids[lo:hi]
+
+    def crossed_down(self, previous, value):
+        """Ids with value < threshold <= previous"""
+        self._compact()
+        lo = np.searchsorted(self.thresholds, value, 'right')
+        hi = np.searchsorted(self.thresholds, previous, 'right')
+        return self.ids[lo:hi]
 
 class AlertSystem:
+    """User alerts on metric thresholds, indexed by metric and condition
+
+    Each (metric, condition) keeps its thresholds sorted, so an evaluation
+    is a binary search per metric rather than a scan over every alert.
+    Level alerts fire whenever the condition holds; alerts created with
+    crossing=True fire only when the value moves across the threshold
+    between two evaluations.
+    """
+
     def __init__(self):
-        self.alerts = []
+        self._alerts = {}
+        self._index = {}
+        self._last_values = {}
+        self._next_id = itertools.count(1)
 
-    def add_alert(self, metric, condition, threshold):
+    @property
+    def alerts(self):
+        return list(self._alerts.values())
+
+    def add_alert(self, metric, condition, threshold, crossing=False):
+        if condition not in ALERT_CONDITIONS:
+            raise ValueError(f"Unknown alert condition: {condition}")
         alert = {
-            'id': len(self.alerts) + 1,
+            'id': next(self._next_id),
             'metric': metric,
             'condition': condition,
             'threshold': threshold,
+            'crossing': crossing,
             'created_at': datetime.now().isoformat()
         }
-        self.alerts.append(alert)
+        self._alerts[alert['id']] = alert
+        self._index.setdefault((metric, condition, crossing), _ThresholdIndex()).add(
+            float(threshold), alert['id']
+        )
         return alert
 
-    def check_alerts(self, current_values):
-        triggered = []
-        for alert in self.alerts:
-            value = current_values.get(alert['metric'])
+    def remove_alert(self, alert_id):
+        """Remove an alert; returns it, or None if no alert has that id"""
+        alert = self._alerts.pop(alert_id, None)
+        if alert is not None:
+            self._index[(alert['metric'], alert['condition'], alert['crossing'])].remove(alert_id)
+        return alert
+
+    def triggered_ids(self, current_values):
+        """Ids of the alerts triggered by current_values, as an array"""
+        matches = []
+        for metric, value in current_values.items():
             if value is None:
                 continue
-            
-            if alert['condition'] == 'above' and value > alert['threshold']:
-                triggered.append(alert)
-            elif alert['condition'] == 'below' and value < alert['threshold']:
-                triggered.append(alert)
-                
-        return triggered
+            previous = self._last_values.get(metric)
+            self._last_values[metric] = value
+
+            for condition in ALERT_CONDITIONS:
+                level = self._index.get((metric, condition, False))
+                if level is not None:
+                    matches.append(level.above(value) if condition == 'above' else level.below(value))
+
+                crossing = self._index.get((metric, condition, True))
+                # The first value of a metric only establishes where it starts from
+                if crossing is not None and previous is not None:
+                    if condition == 'above' and value > previous:
+                        matches.append(crossing.crossed_up(previous, value))
+                    elif condition == 'below' and value < previous:
+                        matches.append(crossing.crossed_down(previous, value))
+
+        if not matches:
+            return np.empty(0, dtype='int64')
+        return np.concatenate(matches)
+
+    def check_alerts(self, current_values):
+        return [self._alerts[alert_id] for alert_id in self.triggered_ids(current_values).tolist()]
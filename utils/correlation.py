@@ -0,0 +1,291 @@
+"""Vectorized correlation across many assets
+
+Series are aligned onto one shared daily index once, with NaN where an
+asset has no value (ETFs on weekends). After that, every pairwise
+correlation comes out of matrix products over the observation mask, so
+each pair is correlated over the days both assets have values, as
+Series.corr does. The full-period matrix is a handful of masked X'X
+products. Rolling matrices for any number of windows all come from the
+same cumulative sums. There are no per-pair Python loops, so the cost
+grows with the number of matrix cells rather than with a loop over each
+pair. RollingCorrelation keeps the same pairwise sums for one window of
+rows and updates them in O(N^2) per new bar; correlation_report keeps one
+per window and series set between calls when given a track key.
+"""
+import threading
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from utils.instrumentation import stage
+
+DEFAULT_WINDOWS = (7, 30, 90)
+MIN_PERIODS = 2  # shared observations a pair needs before its correlation is reported
+
+
+def align_series(series, freq='D', method='price'):
+    """Frame with one column per named series on a shared index
+
+    Each series is resampled to freq (last value per bucket). Timestamps
+    where some series has no value are kept with NaN, so each pair can use
+    every timestamp it shares. method='returns' converts each series to
+    simple returns between its own consecutive values.
+    """
+    columns = {}
+    for name, values in series.items():
+        if values is None or len(values) == 0:
+            continue
+        index = pd.DatetimeIndex(values.index)
+        index = index.tz_localize('UTC') if index.tz is None else index.tz_convert('UTC')
+        columns[name] = pd.Series(values.to_numpy(dtype='float64'), index=index)
+    if not columns:
+        return pd.DataFrame()
+
+    if method not in ('price', 'returns'):
+        raise ValueError(f"Unknown correlation method: {method}")
+    frame = pd.DataFrame(columns).resample(freq).last().dropna(how='all')
+    if method == 'returns':
+        frame = frame.apply(lambda column: column.dropna().pct_change()).dropna(how='all')
+    return frame
+
+
+def _pairwise_correlation(count, sums, squares, products, min_periods=MIN_PERIODS):
+    """Correlations from pairwise-complete moments, each of shape (..., N, N)
+
+    For the pair (i, j), count is the number of shared observations, sums
+    and squares hold the sum of x_i and of x_i**2 over them, and products
+    the sum of x_i * x_j. Pairs with fewer than min_periods observations
+    are NaN.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        transposed = np.swapaxes(sums, -1, -2)
+        covariance = products - sums * transposed / count
+        variance_i = np.maximum(squares - sums ** 2 / count, 0.0)
+        variance_j = np.swapaxes(variance_i, -1, -2)
+        corr = covariance / np.sqrt(variance_i * variance_j)
+    corr = np.clip(corr, -1.0, 1.0)
+    corr[count < max(min_periods, 2)] = np.nan
+    return corr
+
+
+def _observed_means(values):
+    """Mean of each column over its non-NaN values, 0 for an all-NaN column"""
+    observed = ~np.isnan(values)
+    return np.where(observed, values, 0.0).sum(axis=0) / np.maximum(observed.sum(axis=0), 1)
+
+
+def _masked(values):
+    """Centred values with NaN as 0, and the observation mask as floats"""
+    values = np.asarray(values, dtype='float64')
+    observed = ~np.isnan(values)
+    # Centering keeps the sums small and precise
+    return np.where(observed, values - _observed_means(values), 0.0), observed.astype('float64')
+
+
+def _moments(values, observed):
+    """Pairwise-complete (count, sums, squares, products) of masked rows, as _masked returns them"""
+    return observed.T @ observed, values.T @ observed, (values ** 2).T @ observed, values.T @ values
+
+
+def correlation_matrix(values, min_periods=MIN_PERIODS):
+    """Pearson correlation matrix of the columns of a 2-D array, NaN-aware
+
+    Each pair uses the rows where both columns have values.
+    """
+    return _pairwise_correlation(*_moments(*_masked(values)), min_periods)
+
+
+def rolling_correlations(values, windows=DEFAULT_WINDOWS, min_periods=MIN_PERIODS):
+    """Rolling correlation matrices for several windows
+
+    Returns {window: array of shape (T, N, N)}. Row t is the matrix over the
+    window of rows ending at t, each pair using the rows in it where both
+    have values. Rows without a full window are NaN.
+    """
+    values, observed = _masked(values)
+    length, width = values.shape
+
+    def cumulative(left, right):
+        return np.concatenate((
+            np.zeros((1, width, width)),
+            np.cumsum(left[:, :, None] * right[:, None, :], axis=0)
+        ))
+    moments = (
+        cumulative(observed, observed),
+        cumulative(values, observed),
+        cumulative(values ** 2, observed),
+        cumulative(values, values),
+    )
+
+    result = {}
+    for window in windows:
+        out = np.full((length, width, width), np.nan)
+        if 2 <= window <= length:
+            out[window - 1:] = _pairwise_correlation(
+                *(moment[window:] - moment[:-window] for moment in moments), min_periods
+            )
+        result[window] = out
+    return result
+
+
+_trackers = {}  # (track, names, window) -> RollingCorrelation
+_trackers_lock = threading.Lock()
+
+
+def _latest_rolling(frame, window, track):
+    """Latest matrix over the last window rows, from the tracker kept for track"""
+    key = (track, tuple(frame.columns), window)
+    with _trackers_lock:
+        tracker = _trackers.get(key)
+        if tracker is None:
+            tracker = _trackers[key] = RollingCorrelation(frame.columns, window)
+        return tracker.sync(frame)
+
+
+@stage('analytics', 'cpu')
+def correlation_report(frame, windows=DEFAULT_WINDOWS, track=None):
+    """Full-period and latest rolling correlation matrices for an aligned frame
+
+    Rolling windows count rows of the frame (days, as align_series builds it).
+    Reports with the same track key (any hashable naming the series behind
+    frame) keep their rolling windows between calls, and only the rows added
+    or revised since the last call are applied.
+    """
+    names = list(frame.columns)
+    values = frame.to_numpy(dtype='float64')
+
+    def latest(window):
+        if track is None:
+            return correlation_matrix(values[-window:])
+        return _latest_rolling(frame, window, track)
+
+    def to_nested(matrix):
+        return {
+            row: {col: (float(value) if np.isfinite(value) else None) for col, value in zip(names, values_row)}
+            for row, values_row in zip(names, matrix)
+        }
+
+    return {
+        "symbols": names,
+        "observations": len(values),
+        "start": frame.index[0].isoformat() if len(frame) else None,
+        "end": frame.index[-1].isoformat() if len(frame) else None,
+        "full_period": to_nested(correlation_matrix(values)) if len(values) else {},
+        "rolling": {
+            # Only the latest matrix per window is reported, so each needs just its last rows
+            str(window): to_nested(latest(window))
+            for window in windows if 2 <= window <= len(values)
+        },
+    }
+
+
+class RollingCorrelation:
+    """Correlation matrix over the last `window` rows, updated one row at a time
+
+    Rows may hold NaN. Each pair uses the rows in the window where both
+    have values, as correlation_matrix does.
+    """
+
+    def __init__(self, names, window, min_periods=MIN_PERIODS):
+        if window < 2:
+            raise ValueError("Window must be at least 2 bars")
+        self.names = list(names)
+        self.window = window
+        self.min_periods = min_periods
+        self._reset()
+
+    def _reset(self):
+        width = len(self.names)
+        self._rows = deque(maxlen=self.window)
+        self._labels = deque(maxlen=self.window)
+        # Subtracted from every value; correlation ignores the shift and it keeps the sums small
+        self._shift = np.zeros(width)
+        self._moments = [np.zeros((width, width)) for _ in range(4)]
+        self._updates = 0
+
+    @classmethod
+    def from_frame(cls, frame, window):
+        """Seed with the last `window` rows of an aligned frame"""
+        rolling = cls(frame.columns, window)
+        rolling.sync(frame)
+        return rolling
+
+    def _apply(self, row, sign):
+        observed = ~np.isnan(row)
+        values = np.where(observed, row - self._shift, 0.0)[None, :]
+        for total, moment in zip(self._moments, _moments(values, observed.astype('float64')[None, :])):
+            total += sign * moment
+
+    def _resync(self):
+        # Adding and subtracting for ever accumulates rounding error; rebuild
+        # the sums from the buffered rows, re-centred, once per window of updates
+        rows = np.array(self._rows)
+        self._shift = _observed_means(rows)
+        self._moments = list(_moments(*_masked(rows)))
+
+    def update(self, row, label=None):
+        """Add one bar (a value per name, in order, NaN where missing) and return the current matrix"""
+        row = np.asarray(row, dtype='float64')
+        if row.shape != (len(self.names),):
+            raise ValueError(f"Expected {len(self.names)} values, got {row.shape}")
+        if len(self._rows) == self.window:
+            self._apply(self._rows[0], -1.0)
+        self._rows.append(row)
+        self._labels.append(label)
+        self._apply(row, 1.0)
+
+        self._updates += 1
+        if self._updates % self.window == 0:
+            self._resync()
+        return self.matrix()
+
+    def revise(self, row):
+        """Replace the newest bar, e.g. a partial bar that has since moved, and return the current matrix"""
+        row = np.asarray(row, dtype='float64')
+        if not self._rows:
+            raise ValueError("No bar to revise")
+        self._apply(self._rows[-1], -1.0)
+        self._rows[-1] = row
+        self._apply(row, 1.0)
+        return self.matrix()
+
+    def sync(self, frame):
+        """Bring the window up to date with an aligned frame and return the current matrix
+
+        When the frame repeats the buffered rows and only adds rows after
+        them (its newest buffered row may have been revised), just those
+        changes are applied. Otherwise the window is reseeded from the
+        frame's last rows.
+        """
+        if list(frame.columns) != self.names:
+            raise ValueError("Frame columns do not match the tracked names")
+        values = frame.to_numpy(dtype='float64')
+        held = len(self._rows)
+        position = frame.index.get_indexer([self._labels[-1]])[0] if held else -1
+        first = position - held + 1
+        continues = (
+            position >= 0 and first >= 0
+            and len(values) - position - 1 < self.window
+            and list(frame.index[first:position + 1]) == list(self._labels)
+            and np.array_equal(np.array(self._rows)[:-1], values[first:position], equal_nan=True)
+        )
+        if continues:
+            if not np.array_equal(self._rows[-1], values[position], equal_nan=True):
+                self.revise(values[position])
+            start = position + 1
+        else:
+            self._reset()
+            start = max(len(values) - self.window, 0)
+        for label, row in zip(frame.index[start:], values[start:]):
+            self.update(row, label)
+        return self.matrix()
+
+    def matrix(self):
+        """Current correlation matrix; pairs with fewer than min_periods shared bars are NaN"""
+        if len(self._rows) < 2:
+            return np.full((len(self.names), len(self.names)), np.nan)
+        return _pairwise_correlation(*self._moments, self.min_periods)
+
+    def to_frame(self):
+        return pd.DataFrame(self.matrix(), index=self.names, columns=self.names)
@@ -1,29 +1,77 @@
-import yfinance as yf
+import os
+import contextvars
+import concurrent.futures
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from sqlalchemy import func
 from utils.database import (
     store_bitcoin_price, store_etf_data, store_onchain_metrics,
-    BitcoinPrice, ETFData, OnchainMetric, get_db
+    get_timestamp_range, get_price_table_stats, get_data_version, load_bitcoin_prices, load_etf_history, load_onchain_metrics,
+    BitcoinPrice, OnchainMetric
 )
+from utils import timeseries_store
+from utils.orderbook import OrderBook
+from utils.queries import get_range
+from utils.market_data import get_provider
+from utils.onchain import get_onchain_source
+from utils.singleflight import single_flight
+from utils.instrumentation import stage
 import logging
 
 logger = logging.getLogger(__name__)
 
-def get_bitcoin_data():
-    """Fetch current Bitcoin price data"""
+# How long stored history is served before the upstream tail is fetched again,
+# per bar interval. Only daily bars are persisted in bitcoin_prices.
+PRICE_HISTORY_TTL = {
+    '1d': timedelta(hours=1),
+}
+PRICE_HISTORY_WINDOW = timedelta(days=365)
+
+# Last successful upstream refresh per interval (process local)
+_history_refreshed_at = {}
+
+# bitcoin_prices write counter the columnar store was last synced at, per interval (process local)
+_store_synced_version = {}
+
+# With INGESTION_MODE=in_process or worker, utils.ingestion keeps the database
+# current and request-path calls only read persisted data.
+_upstream_on_request = os.getenv('INGESTION_MODE', 'inline') == 'inline'
+
+def set_upstream_on_request(enabled):
+    """Choose whether fetch functions call upstream by default or only read the database"""
+    global _upstream_on_request
+    _upstream_on_request = enabled
+
+def _should_refresh(refresh):
+    return _upstream_on_request if refresh is None else refresh
+
+def _latest_from_history(history):
+    """Summarize the last bar of a price frame"""
+    return {
+        'price': float(history['Close'].iloc[-1]),
+        'volume': float(history['Volume'].iloc[-1]),
+        'change_24h': float(history['Close'].iloc[-1] - history['Open'].iloc[-1]),
+        'timestamp': history.index[-1].isoformat()
+    }
+
+@single_flight(lambda refresh=None: ('BTC-USD', '1d', _should_refresh(refresh)))
+def get_bitcoin_data(refresh=None):
+    """Fetch current Bitcoin price data
+
+    With refresh=False (the default under background ingestion) the latest
+    stored bar is returned without contacting upstream.
+    """
     try:
-        btc = yf.Ticker("BTC-USD")
-        history = btc.history(period="1d")
+        if not _should_refresh(refresh):
+            history = load_bitcoin_prices(start=datetime.utcnow() - timedelta(days=2))
+            return _latest_from_history(history) if not history.empty else None
+
+        provider = get_provider()
+        with stage('upstream_fetch', provider.name):
+            history = provider.history("BTC-USD", period="1d")
 
         if isinstance(history, pd.DataFrame) and not history.empty:
-            latest_data = {
-                'price': float(history['Close'].iloc[-1]),
-                'volume': float(history['Volume'].iloc[-1]),
-                'change_24h': float(history['Close'].iloc[-1] - history['Open'].iloc[0]),
-                'timestamp': history.index[-1].isoformat()
-            }
+            latest_data = _latest_from_history(history)
             # Store in database
             store_bitcoin_price(history)
             return latest_data
@@ -31,85 +79,194 @@ def get_bitcoin_data():
     except Exception as e:
         raise Exception(f"Error fetching Bitcoin data: {str(e)}")
 
-def fetch_bitcoin_price():
-    """Fetch Bitcoin historical price data"""
-    try:
-        btc = yf.Ticker("BTC-USD")
-        history = btc.history(period="1y")
+def _load_bitcoin_history(interval, start):
+    """Read stored history, through the local columnar store when pyarrow is available"""
+    store = timeseries_store.get_store()
+    if store is None:
+        return load_bitcoin_prices(start=start)
 
-        if isinstance(history, pd.DataFrame) and not history.empty:
-            # Store in database
-            store_bitcoin_price(history)
-            return history
-        return pd.DataFrame()
+    # The database stays the source of truth; its write counter tells whether
+    # the local copy can have fallen behind since it was last synced
+    version = get_data_version(BitcoinPrice)
+    if version['newest'] is None:
+        return load_bitcoin_prices(start=start)
+    if _store_synced_version.get(interval) != version['version']:
+        _sync_store(store, interval)
+        _store_synced_version[interval] = version['version']
+    return store.read('BTC-USD', interval, start=start)
+
+def _sync_store(store, interval):
+    """Bring the columnar store up to date with bitcoin_prices
+
+    Bars from the store's newest one onwards are merged in; the newest is
+    re-read in case it was still partial. The store is only rebuilt when
+    the rows below that bar no longer match, e.g. after a backfill.
+    """
+    store_count, store_oldest, store_newest = store.stats('BTC-USD', interval)
+    if store_newest is not None:
+        newest = store_newest.tz_convert('UTC').tz_localize(None)
+        db_count, db_oldest = get_price_table_stats(before=newest)
+        if db_count == store_count - 1 \
+                and pd.Timestamp(db_oldest) == store_oldest.tz_convert('UTC').tz_localize(None):
+            store.write('BTC-USD', interval, load_bitcoin_prices(start=newest))
+            return
+    store.replace('BTC-USD', interval, load_bitcoin_prices())
+
+def _refresh_bitcoin_history(interval):
+    """Fetch bars newer than the latest stored one and write them to the database"""
+    provider = get_provider()
+    oldest, newest = get_timestamp_range(BitcoinPrice)
+
+    # Backfill the whole window unless stored history already covers it
+    with stage('upstream_fetch', provider.name):
+        if newest is None or oldest > datetime.utcnow() - PRICE_HISTORY_WINDOW + timedelta(days=1):
+            history = provider.history("BTC-USD", period="1y", interval=interval)
+        else:
+            # Re-fetch the newest stored bar too, it may have been partial when stored;
+            # the upsert overwrites it in place
+            history = provider.history("BTC-USD", start=newest.strftime('%Y-%m-%d'), interval=interval)
+
+    if isinstance(history, pd.DataFrame) and not history.empty:
+        store_bitcoin_price(history)
+
+def refresh_bitcoin_history(interval='1d', ttl=None, refresh=None):
+    """Fetch the upstream tail of the stored history if its TTL has elapsed
+
+    Upstream failures are logged, not raised, so callers can serve what is stored.
+    """
+    if interval not in PRICE_HISTORY_TTL:
+        raise ValueError(f"Unsupported interval: {interval}")
+    if ttl is None:
+        ttl = PRICE_HISTORY_TTL[interval]
+
+    now = datetime.utcnow()
+    refreshed_at = _history_refreshed_at.get(interval)
+    if _should_refresh(refresh) and (refreshed_at is None or now - refreshed_at >= ttl):
+        try:
+            _refresh_bitcoin_history(interval)
+            _history_refreshed_at[interval] = now
+        except Exception as e:
+            logger.warning(f"Upstream refresh of Bitcoin history failed: {str(e)}")
+
+@single_flight(lambda interval='1d', ttl=None, refresh=None: ('BTC-USD', interval, ttl, _should_refresh(refresh)))
+def fetch_bitcoin_price(interval='1d', ttl=None, refresh=None):
+    """Fetch Bitcoin historical price data
+
+    History is read from the bitcoin_prices table. Upstream is only asked for
+    the bars after the newest stored one, and only once the interval's TTL
+    (PRICE_HISTORY_TTL, or ttl if given) has elapsed since the last refresh.
+    With refresh=False upstream is never contacted.
+    """
+    try:
+        refresh_bitcoin_history(interval, ttl=ttl, refresh=refresh)
+        return _load_bitcoin_history(interval, datetime.utcnow() - PRICE_HISTORY_WINDOW)
     except Exception as e:
         raise Exception(f"Error fetching Bitcoin price data: {str(e)}")
 
-def fetch_etf_data(period='1_week'):
-    """Fetch Bitcoin ETF data and store in database"""
-    period_map = {
-        '1_week': '7d',
-        '1_month': '30d',
-        '3_months': '90d',
-        '6_months': '180d',
-        '1_year': '365d'
+ETF_SYMBOLS = ['BITO', 'BITI', 'BTF']  # Example Bitcoin ETF tickers
+ETF_FETCH_TIMEOUT = float(os.getenv('ETF_FETCH_TIMEOUT', '10'))  # seconds per ticker
+
+# Shared, bounded pool for per-ticker ETF fetches
+_etf_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=int(os.getenv('ETF_FETCH_WORKERS', '8')),
+    thread_name_prefix='etf-fetch'
+)
+
+def _simulated_orderbook(history):
+    """Generate simulated orderbook data around the latest close"""
+    current_price = float(history['Close'].iloc[-1])
+    spread_percentage = 0.005  # 0.5% spread for better visibility
+    depth_levels = 10
+
+    # Generate bid and ask prices with wider spread
+    steps = spread_percentage * np.arange(1, depth_levels + 1)
+
+    # Generate more realistic volumes that decrease exponentially
+    base_volume = float(history['Volume'].mean()) / 50  # Adjusted divisor for better scale
+    volumes = base_volume * np.exp(-0.3 * np.arange(depth_levels))
+
+    # OrderBook sorts each side from the best level outwards
+    return OrderBook(
+        bid_prices=current_price * (1 - steps),
+        bid_sizes=volumes,
+        ask_prices=current_price * (1 + steps),
+        ask_sizes=volumes[::-1]  # Reverse volumes for asks
+    ).to_dict()
+
+def _fetch_etf(etf, start, from_upstream):
+    """Fetch (or load from the database) one ETF's bars; returns None if unusable"""
+    if from_upstream:
+        provider = get_provider()
+        with stage('upstream_fetch', provider.name):
+            history = provider.history(etf, start=start.strftime('%Y-%m-%d'), timeout=ETF_FETCH_TIMEOUT)
+    else:
+        history = load_etf_history(etf, start=start)
+
+    if not isinstance(history, pd.DataFrame) or history.empty:
+        logger.warning(f"No data available for ETF {etf}")
+        return None
+
+    required_columns = ['Close', 'Open', 'High', 'Low', 'Volume'] if from_upstream else ['Close', 'Volume']
+    if not all(col in history.columns for col in required_columns):
+        logger.warning(f"Missing required columns for ETF {etf}")
+        return None
+
+    # Convert any numeric columns to float
+    for col in required_columns:
+        if col in history.columns:
+            history[col] = history[col].astype(float)
+
+    etf_data = {
+        'history': history,
+        'orderbook': _simulated_orderbook(history)
     }
-    interval = period_map.get(period, '7d')
-    etfs = ['BITO', 'BITI', 'BTF']  # Example Bitcoin ETF tickers
-    data = {}
 
-    for etf in etfs:
-        try:
-            ticker = yf.Ticker(etf)
-            history = ticker.history(period="1y")
-
-            if not isinstance(history, pd.DataFrame) or history.empty:
-                logger.warning(f"No data available for ETF {etf}")
-                continue
-
-            required_columns = ['Close', 'Open', 'High', 'Low', 'Volume']
-            if not all(col in history.columns for col in required_columns):
-                logger.warning(f"Missing required columns for ETF {etf}")
-                continue
-
-            # Convert any numeric columns to float
-            for col in required_columns:
-                if col in history.columns:
-                    history[col] = history[col].astype(float)
-
-            # Generate simulated orderbook data
-            current_price = float(history['Close'].iloc[-1])
-            spread_percentage = 0.005  # 0.5% spread for better visibility
-            depth_levels = 10
-
-            # Generate bid and ask prices with wider spread
-            bid_prices = [current_price * (1 - spread_percentage * (i + 1)) for i in range(depth_levels)]
-            ask_prices = [current_price * (1 + spread_percentage * (i + 1)) for i in range(depth_levels)]
-
-            # Generate more realistic volumes that decrease exponentially
-            base_volume = float(history['Volume'].mean()) / 50  # Adjusted divisor for better scale
-            volumes = [base_volume * np.exp(-0.3 * i) for i in range(depth_levels)]
-
-            # Create orderbook with sorted prices and volumes
-            orderbook = {
-                'bid_prices': sorted(bid_prices, reverse=True),  # Higher to lower
-                'bid_volumes': volumes,
-                'ask_prices': sorted(ask_prices),  # Lower to higher
-                'ask_volumes': volumes[::-1]  # Reverse volumes for asks
-            }
-
-            data[etf] = {
-                'history': history,
-                'orderbook': orderbook
-            }
-
-            # Store valid data in database
-            store_etf_data(etf, data[etf])
-            logger.info(f"Successfully fetched and stored data for ETF {etf}")
+    if from_upstream:
+        # Store valid data in database
+        store_etf_data(etf, etf_data)
+        logger.info(f"Successfully fetched and stored data for ETF {etf}")
+    return etf_data
 
+@single_flight(lambda period='1_week', refresh=None: ('ETF', period, _should_refresh(refresh)))
+def fetch_etf_data(period='1_week', refresh=None):
+    """Fetch Bitcoin ETF data and store in database
+
+    Tickers are fetched concurrently, each with its own timeout
+    (ETF_FETCH_TIMEOUT); tickers that miss it are left out of the result.
+    With refresh=False the stored ETF bars are returned without contacting upstream.
+    """
+    period_days = {
+        '1_week': 7,
+        '1_month': 30,
+        '3_months': 90,
+        '6_months': 180,
+        '1_year': 365
+    }
+    start = datetime.utcnow() - timedelta(days=period_days.get(period, 7))
+    from_upstream = _should_refresh(refresh)
+
+    futures = {
+        # Each task runs in a copy of the caller's context, so its stages keep the request's route
+        etf: _etf_executor.submit(contextvars.copy_context().run, _fetch_etf, etf, start, from_upstream)
+        for etf in ETF_SYMBOLS
+    }
+    # Every ticker runs in parallel, so one timeout bounds the whole batch;
+    # the extra second lets requests raise their own timeout first.
+    concurrent.futures.wait(futures.values(), timeout=ETF_FETCH_TIMEOUT + 1)
+
+    data = {}
+    for etf, future in futures.items():
+        if not future.done():
+            future.cancel()
+            logger.error(f"Timed out fetching data for {etf}")
+            continue
+        try:
+            etf_data = future.result()
         except Exception as e:
             logger.error(f"Error fetching data for {etf}: {str(e)}")
             continue
+        if etf_data is not None:
+            data[etf] = etf_data
 
     if len(data) == 0:
         logger.warning("No ETF data available")
@@ -117,49 +274,51 @@ def fetch_etf_data(period='1_week'):
 
     return data
 
-def fetch_onchain_metrics():
-    """Fetch on-chain metrics and store in database"""
+ONCHAIN_HISTORY_DAYS = 365
+
+def _ingest_onchain_metrics(today):
+    """Fetch and store the days after the newest stored one, up to today; returns rows added"""
+    newest = get_timestamp_range(OnchainMetric)[1]
+    if newest is None:
+        first = today - timedelta(days=ONCHAIN_HISTORY_DAYS - 1)
+    else:
+        first = pd.Timestamp(newest).normalize() + timedelta(days=1)
+    if first > today:
+        return 0
+
+    source = get_onchain_source()
+    with stage('upstream_fetch', source.name):
+        metrics = source.metrics(pd.date_range(first, today, freq='D', name='timestamp'))
+    result = store_onchain_metrics(metrics)
+    return result['inserted']
+
+@single_flight(lambda refresh=None: ('BTC', '1d', _should_refresh(refresh)))
+def fetch_onchain_metrics(refresh=None):
+    """Fetch on-chain metrics, one row per day, from the database
+
+    Only the days missing since the newest stored row are fetched from the
+    on-chain source (utils.onchain) and stored, so a call adds at most a
+    day's row in steady state. With refresh=False nothing is fetched.
+    """
     try:
-        # Generate sample data for the last year to match ETF data
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=365)
-        dates = pd.date_range(start=start_date, end=end_date, freq='D')
-
-        data = {
-            'timestamp': dates,
-            'active_addresses': np.random.randint(800000, 1200000, size=len(dates)),
-            'transaction_volume': np.random.randint(200000, 500000, size=len(dates)),
-            'hash_rate': np.random.randint(200, 300, size=len(dates))
-        }
-
-        df = pd.DataFrame(data)
-        df.set_index('timestamp', inplace=True)
-
-        # Store in database
-        store_onchain_metrics(df)
-        return df
+        today = pd.Timestamp(datetime.utcnow()).normalize()
+        if _should_refresh(refresh):
+            _ingest_onchain_metrics(today)
+        return load_onchain_metrics(start=today - timedelta(days=ONCHAIN_HISTORY_DAYS - 1))
     except Exception as e:
-        raise Exception(f"Error generating on-chain metrics: {str(e)}")
+        raise Exception(f"Error fetching on-chain metrics: {str(e)}")
 
 
 def get_historical_metrics():
     """Retrieve historical metrics from database"""
     try:
-        db = next(get_db())
-
-        # Get latest metrics
-        latest_metrics = db.query(OnchainMetric).order_by(
-            OnchainMetric.timestamp.desc()
-        ).limit(30).all()
+        # Latest 30 metrics, newest first
+        latest_metrics = get_range(OnchainMetric, limit=30, newest_first=True)
 
-        if not latest_metrics:
+        if latest_metrics.empty:
             return pd.DataFrame()
 
-        return pd.DataFrame([{
-            'date': metric.timestamp,
-            'active_addresses': metric.active_addresses,
-            'transaction_volume': metric.transaction_volume,
-            'hash_rate': metric.hash_rate
-        } for metric in latest_metrics])
+        latest_metrics.index = latest_metrics.index.tz_localize(None)
+        return latest_metrics.rename_axis('date').reset_index()
     except Exception as e:
-        raise Exception(f"Error retrieving historical metrics: {str(e)}")
\ No newline at end of file
+        raise Exception(f"Error retrieving historical metrics: {str(e)}")
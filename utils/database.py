@@ -1,41 +1,151 @@
 import os
+import time
+import threading
 import pandas as pd
-from sqlalchemy import create_engine, Column, Integer, Float, String, DateTime, inspect
+from datetime import datetime
+from sqlalchemy import (
+    create_engine, event, Column, Integer, Float, String, DateTime, Index,
+    inspect, select, insert, update, delete, func, tuple_, bindparam, literal_column, text
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from datetime import datetime
+from sqlalchemy.pool import StaticPool
 import logging
+from utils.instrumentation import stage
 
-# Initialize SQLAlchemy with PostgreSQL
-try:
-    DATABASE_URL = os.getenv('DATABASE_URL')
-    if not DATABASE_URL:
-        raise ValueError("DATABASE_URL environment variable is not set")
+# Used when DATABASE_URL is unset: a local SQLite file next to the other data files
+DEFAULT_DATABASE_URL = 'sqlite:///' + os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'bitcoin_analytics.db'
+)
 
-    # Add SSL configuration to handle connection issues
-    connect_args = {
-        "sslmode": "require",
-        "connect_timeout": 30
-    }
+# Connection pool limits; size them to the number of worker threads per process
+POOL_SETTINGS = {
+    'pool_size': int(os.getenv('DB_POOL_SIZE', '5')),
+    'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '10')),
+    'pool_timeout': float(os.getenv('DB_POOL_TIMEOUT', '30')),
+    'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', '3600')),  # Recycle connections every hour
+}
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '30000'))
 
-    engine = create_engine(
-        DATABASE_URL, 
-        connect_args=connect_args,
-        pool_pre_ping=True,  # Enable connection health checks
-        pool_recycle=3600    # Recycle connections every hour
-    )
+# The engine is created on first use, not at import, so importing this module
+# (or anything that imports it) never opens a connection
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+Base = declarative_base()
+
+_engine = None
+_engine_ready = False
+_engine_initializing = False
+_engine_lock = threading.RLock()
+
+def _configure_sqlite(engine):
+    """WAL journaling lets readers proceed while the ingestion writer commits"""
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.close()
+
+def create_engine_for_url(url):
+    """Engine for a database URL, with backend-specific connection settings"""
+    url = make_url(url)
+    backend = url.get_backend_name()
+
+    if backend == 'postgresql':
+        return create_engine(
+            url,
+            # Add SSL configuration to handle connection issues
+            connect_args={
+                "sslmode": os.getenv('DB_SSLMODE', 'require'),
+                "connect_timeout": 30
+            },
+            pool_pre_ping=True,  # Enable connection health checks
+            **POOL_SETTINGS
+        )
+
+    if backend == 'sqlite':
+        if url.database in (None, '', ':memory:'):
+            # One shared connection, or every checkout would see a new empty database
+            return create_engine(url, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        os.makedirs(os.path.dirname(os.path.abspath(url.database)), exist_ok=True)
+        engine = create_engine(
+            url,
+            connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+            pool_size=POOL_SETTINGS['pool_size'],
+            max_overflow=POOL_SETTINGS['max_overflow'],
+            pool_timeout=POOL_SETTINGS['pool_timeout']
+        )
+        _configure_sqlite(engine)
+        return engine
+
+    return create_engine(url, pool_pre_ping=True, **POOL_SETTINGS)
+
+def get_engine():
+    """The process-wide engine, created and initialized on first use
+
+    DATABASE_URL selects the backend (postgresql://..., sqlite:///path);
+    without it a local SQLite file is used.
+    """
+    global _engine, _engine_ready, _engine_initializing
+    if _engine_ready:
+        return _engine
+
+    with _engine_lock:
+        if _engine is None:
+            try:
+                _engine = create_engine_for_url(os.getenv('DATABASE_URL') or DEFAULT_DATABASE_URL)
+                SessionLocal.configure(bind=_engine)
+            except Exception as e:
+                logging.error(f"Database initialization error: {str(e)}")
+                raise
+        if not _engine_ready and not _engine_initializing:
+            # init_db calls back into get_engine on this thread; other threads
+            # wait on the lock until the schema is in place
+            _engine_initializing = True
+            try:
+                # On failure the next call retries
+                if init_db():
+                    _engine_ready = True
+                else:
+                    logging.error("Failed to initialize database. Some features may not work properly.")
+            finally:
+                _engine_initializing = False
+    return _engine
 
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-    Base = declarative_base()
-except Exception as e:
-    logging.error(f"Database initialization error: {str(e)}")
-    raise
+def dispose_engine():
+    """Close pooled connections and forget the engine (e.g. after forking a worker)"""
+    global _engine, _engine_ready
+    with _engine_lock:
+        if _engine is not None:
+            _engine.dispose()
+        _engine = None
+        _engine_ready = False
+
+def __getattr__(name):
+    # Keeps `from utils.database import engine` and `database.engine` working lazily
+    if name == 'engine':
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Range reads select every value column by (symbol and) time, so on PostgreSQL
+# the unique natural-key indexes INCLUDE those columns and the reads become
+# index-only scans. Other backends ignore postgresql_include.
 
 class BitcoinPrice(Base):
     __tablename__ = "bitcoin_prices"
+    __table_args__ = (
+        Index(
+            'ix_bitcoin_prices_timestamp', 'timestamp', unique=True,
+            postgresql_include=['open_price', 'high_price', 'low_price', 'close_price', 'volume']
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    timestamp = Column(DateTime, nullable=False, index=True)
+    timestamp = Column(DateTime, nullable=False)
     open_price = Column(Float, nullable=False)
     high_price = Column(Float, nullable=False)
     low_price = Column(Float, nullable=False)
@@ -44,35 +154,200 @@ class BitcoinPrice(Base):
 
 class ETFData(Base):
     __tablename__ = "etf_data"
+    __table_args__ = (
+        Index(
+            'uq_etf_data_symbol_timestamp', 'symbol', 'timestamp', unique=True,
+            postgresql_include=['price', 'volume']
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    timestamp = Column(DateTime, nullable=False, index=True)
-    symbol = Column(String, nullable=False, index=True)
+    timestamp = Column(DateTime, nullable=False)
+    symbol = Column(String, nullable=False)
     price = Column(Float, nullable=False)
     volume = Column(Float, nullable=False, default=0.0)
     assets = Column(Float, nullable=True)
 
 class OnchainMetric(Base):
     __tablename__ = "onchain_metrics"
+    __table_args__ = (
+        Index(
+            'ix_onchain_metrics_timestamp', 'timestamp', unique=True,
+            postgresql_include=['active_addresses', 'transaction_volume', 'hash_rate']
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    timestamp = Column(DateTime, nullable=False, index=True)
+    timestamp = Column(DateTime, nullable=False)
     active_addresses = Column(Integer, nullable=False)
     transaction_volume = Column(Float, nullable=False)
     hash_rate = Column(Float, nullable=False)
 
+class PriceRollup(Base):
+    """OHLCV per time bucket for Bitcoin ('BTC') and each ETF symbol"""
+    __tablename__ = "price_rollups"
+    __table_args__ = (
+        Index(
+            'uq_price_rollups_resolution_symbol_bucket', 'resolution', 'symbol', 'bucket', unique=True,
+            postgresql_include=['open_price', 'high_price', 'low_price', 'close_price', 'volume']
+        ),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    resolution = Column(String, nullable=False)
+    symbol = Column(String, nullable=False)
+    bucket = Column(DateTime, nullable=False)
+    open_price = Column(Float, nullable=False)
+    high_price = Column(Float, nullable=False)
+    low_price = Column(Float, nullable=False)
+    close_price = Column(Float, nullable=False)
+    volume = Column(Float, nullable=False, default=0.0)
+    bar_count = Column(Integer, nullable=False)
+
+class OnchainRollup(Base):
+    """Averages and totals of on-chain metrics per time bucket"""
+    __tablename__ = "onchain_rollups"
+    __table_args__ = (
+        Index(
+            'uq_onchain_rollups_resolution_bucket', 'resolution', 'bucket', unique=True,
+            postgresql_include=['active_addresses', 'transaction_volume', 'hash_rate']
+        ),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    resolution = Column(String, nullable=False)
+    bucket = Column(DateTime, nullable=False)
+    active_addresses = Column(Float, nullable=False)    # mean per sample
+    transaction_volume = Column(Float, nullable=False)  # total
+    hash_rate = Column(Float, nullable=False)           # mean per sample
+    sample_count = Column(Integer, nullable=False)
+
+class TableVersion(Base):
+    """Write counter and last write time per table, bumped in the same transaction as every upsert"""
+    __tablename__ = "table_versions"
+
+    table_name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=True)  # naive UTC
+
+# Natural key of each table, used for upserts
+NATURAL_KEYS = {
+    BitcoinPrice: ['timestamp'],
+    ETFData: ['symbol', 'timestamp'],
+    OnchainMetric: ['timestamp'],
+    PriceRollup: ['resolution', 'symbol', 'bucket'],
+    OnchainRollup: ['resolution', 'bucket'],
+}
+
+# Rows per INSERT ... ON CONFLICT statement
+UPSERT_CHUNK_SIZE = 1000
+
+def _ensure_natural_keys(inspector):
+    """Add the unique natural-key indexes to tables created before they existed"""
+    table_names = inspector.get_table_names()
+    for model, keys in NATURAL_KEYS.items():
+        table = model.__table__
+        if table.name not in table_names:
+            continue
+        unique_indexes = [
+            index['column_names'] for index in inspector.get_indexes(table.name)
+            if index['unique']
+        ]
+        unique_constraints = [
+            constraint['column_names']
+            for constraint in inspector.get_unique_constraints(table.name)
+        ]
+        if keys in unique_indexes or keys in unique_constraints:
+            continue
+
+        key_columns = [table.c[key] for key in keys]
+        keep = select(func.max(table.c.id)).group_by(*key_columns)
+        existing_names = {index['name'] for index in inspector.get_indexes(table.name)}
+        with get_engine().begin() as conn:
+            # Earlier versions appended duplicate rows; keep the newest copy
+            removed = conn.execute(delete(table).where(table.c.id.not_in(keep))).rowcount
+            _bump_version(conn, table.name)
+            for index in table.indexes:
+                if index.unique and [c.name for c in index.columns] == keys:
+                    # Replaces the non-unique index of the same name, if any
+                    if index.name in existing_names:
+                        index.drop(bind=conn)
+                    index.create(bind=conn)
+        logging.info(f"Added natural key to {table.name}, removed {removed} duplicate rows")
+
+# Indexes earlier versions created that the models no longer define: separate
+# covering copies of the natural keys, and etf_data's single-column indexes
+OBSOLETE_INDEXES = {
+    'bitcoin_prices': ['ix_bitcoin_prices_timestamp_covering'],
+    'etf_data': ['ix_etf_data_symbol_timestamp_covering', 'ix_etf_data_symbol', 'ix_etf_data_timestamp'],
+    'onchain_metrics': ['ix_onchain_metrics_timestamp_covering'],
+    'price_rollups': ['ix_price_rollups_resolution_symbol_bucket_covering'],
+    'onchain_rollups': ['ix_onchain_rollups_resolution_bucket_covering'],
+}
+
+def _ensure_indexes(inspector):
+    """Bring secondary indexes in line with the models after their tables were created
+
+    Creates missing non-unique indexes, drops OBSOLETE_INDEXES and, on
+    PostgreSQL, rebuilds natural-key indexes that lack their INCLUDE columns.
+    """
+    engine = get_engine()
+    for table in Base.metadata.sorted_tables:
+        if table.name not in inspector.get_table_names():
+            continue
+        existing = {index['name']: index for index in inspector.get_indexes(table.name)}
+        with engine.begin() as conn:
+            for name in OBSOLETE_INDEXES.get(table.name, []):
+                if name in existing:
+                    conn.execute(text(f'DROP INDEX {conn.dialect.identifier_preparer.quote(name)}'))
+            for index in table.indexes:
+                if index.name not in existing:
+                    if not index.unique:
+                        index.create(bind=conn)
+                    continue
+                include = index.dialect_options['postgresql']['include']
+                reflected = existing[index.name].get('dialect_options', {}).get('postgresql_include', [])
+                if conn.dialect.name == 'postgresql' and include and list(reflected) != list(include):
+                    index.drop(bind=conn)
+                    index.create(bind=conn)
+
+def _ensure_columns(inspector):
+    """Add nullable columns added to the models after their tables were created"""
+    engine = get_engine()
+    for table in Base.metadata.sorted_tables:
+        if table.name not in inspector.get_table_names():
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable:
+                continue
+            column_type = column.type.compile(dialect=engine.dialect)
+            with engine.begin() as conn:
+                conn.execute(text(
+                    f'ALTER TABLE {conn.dialect.identifier_preparer.format_table(table)} '
+                    f'ADD COLUMN {conn.dialect.identifier_preparer.format_column(column)} {column_type}'
+                ))
+
 def init_db():
     """Initialize database tables"""
     try:
-        inspector = inspect(engine)
-        tables_exist = all(
-            table in inspector.get_table_names()
-            for table in ['bitcoin_prices', 'etf_data', 'onchain_metrics']
-        )
+        engine = get_engine()
+        existing = set(inspect(engine).get_table_names())
 
-        if not tables_exist:
-            Base.metadata.create_all(bind=engine)
+        # Creates only the missing tables, so everything below can inspect all of them
+        Base.metadata.create_all(bind=engine)
+        if not existing & {'bitcoin_prices', 'etf_data', 'onchain_metrics'}:
             logging.info("Database tables created successfully")
+            return True
+
+        # A fresh inspector: the first one cached the table list from before create_all
+        inspector = inspect(engine)
+        _ensure_columns(inspector)
+        _ensure_natural_keys(inspector)
+        _ensure_indexes(inspector)
+        if not {'price_rollups', 'onchain_rollups'} <= existing:
+            rebuild_rollups()
+        compact_onchain_metrics()
         return True
     except Exception as e:
         logging.error(f"Failed to initialize database: {str(e)}")
@@ -80,7 +355,7 @@ def init_db():
 
 def get_db():
     """Database session context manager"""
-    db = SessionLocal()
+    db = SessionLocal(bind=get_engine())
     try:
         yield db
     finally:
@@ -89,92 +364,615 @@ def get_db():
 # Alias for compatibility with main.py
 get_db_connection = get_db
 
+def check_database():
+    """Round-trip a trivial query; returns status, latency in ms and the backend name"""
+    started = time.perf_counter()
+    try:
+        engine = get_engine()
+        with engine.connect() as conn:
+            conn.execute(select(literal_column('1'))).scalar()
+        status = 'connected'
+        backend = engine.dialect.name
+    except Exception as e:
+        logging.error(f"Database health check failed: {str(e)}")
+        status = 'unavailable'
+        backend = None
+    return {
+        'status': status,
+        'latency_ms': round((time.perf_counter() - started) * 1000, 2),
+        'backend': backend
+    }
+
+def _utc_timestamps(index):
+    """Convert a DatetimeIndex to naive UTC datetimes as stored in the database"""
+    index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        index = index.tz_convert('UTC').tz_localize(None)
+    return index.to_pydatetime()
+
+def _frame_to_records(columns, required):
+    """Build upsert rows from a dict of column arrays, dropping rows with missing values"""
+    frame = pd.DataFrame(columns)
+    valid = frame[required].notna().all(axis=1)
+    if not valid.all():
+        logging.warning(f"Skipping {int((~valid).sum())} rows with missing values")
+    frame = frame[valid]
+    return frame.astype(object).where(frame.notna(), None).to_dict('records')
+
+def _upsert_postgresql(conn, table, records, keys, values):
+    """Set-based INSERT ... ON CONFLICT DO UPDATE, counting inserts via xmax"""
+    inserted = 0
+    for start in range(0, len(records), UPSERT_CHUNK_SIZE):
+        stmt = pg_insert(table).values(records[start:start + UPSERT_CHUNK_SIZE])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=keys,
+            set_={column: stmt.excluded[column] for column in values}
+        ).returning(literal_column('xmax = 0'))
+        inserted += sum(1 for (was_inserted,) in conn.execute(stmt) if was_inserted)
+    return {"inserted": inserted, "updated": len(records) - inserted}
+
+def _upsert_executemany(conn, table, records, keys, values):
+    """Portable upsert for SQLite and other backends: one executemany each for inserts and updates"""
+    key_columns = [table.c[key] for key in keys]
+    existing = set()
+    for start in range(0, len(records), UPSERT_CHUNK_SIZE):
+        chunk = [tuple(record[key] for key in keys) for record in records[start:start + UPSERT_CHUNK_SIZE]]
+        if len(keys) == 1:
+            condition = key_columns[0].in_([key[0] for key in chunk])
+        else:
+            condition = tuple_(*key_columns).in_(chunk)
+        existing.update(tuple(row) for row in conn.execute(select(*key_columns).where(condition)))
+
+    to_insert = [r for r in records if tuple(r[key] for key in keys) not in existing]
+    to_update = [
+        {**{f"key_{key}": r[key] for key in keys}, **{column: r[column] for column in values}}
+        for r in records if tuple(r[key] for key in keys) in existing
+    ]
+
+    if to_insert:
+        conn.execute(insert(table), to_insert)
+    if to_update:
+        stmt = update(table).where(
+            *[table.c[key] == bindparam(f"key_{key}") for key in keys]
+        ).values({column: bindparam(column) for column in values})
+        conn.execute(stmt, to_update)
+    return {"inserted": len(to_insert), "updated": len(to_update)}
+
+def bulk_upsert(model, records):
+    """Insert or update rows keyed on the model's natural key
+
+    Returns a dict with the number of rows inserted and updated.
+    """
+    if not records:
+        return {"inserted": 0, "updated": 0}
+
+    table = model.__table__
+    keys = NATURAL_KEYS[model]
+    values = [column for column in records[0] if column not in keys]
+
+    # Within one batch the last row for a key wins
+    records = list({tuple(r[key] for key in keys): r for r in records}.values())
+
+    with get_engine().begin() as conn:
+        if conn.dialect.name == 'postgresql':
+            result = _upsert_postgresql(conn, table, records, keys, values)
+        else:
+            result = _upsert_executemany(conn, table, records, keys, values)
+        _bump_version(conn, table.name)
+        return result
+
+def _bump_version(conn, table_name):
+    """Increment a table's write counter inside the caller's transaction"""
+    versions = TableVersion.__table__
+    now = datetime.utcnow()
+    dialect_insert = {'postgresql': pg_insert, 'sqlite': sqlite_insert}.get(conn.dialect.name)
+    if dialect_insert is not None:
+        statement = dialect_insert(versions).values(table_name=table_name, version=1, updated_at=now)
+        conn.execute(statement.on_conflict_do_update(
+            index_elements=['table_name'], set_={'version': versions.c.version + 1, 'updated_at': now}
+        ))
+        return
+    bumped = conn.execute(
+        update(versions).where(versions.c.table_name == table_name)
+        .values(version=versions.c.version + 1, updated_at=now)
+    )
+    if bumped.rowcount == 0:
+        conn.execute(insert(versions).values(table_name=table_name, version=1, updated_at=now))
+
+@stage('db_read', 'database')
+def get_timestamp_range(model):
+    """Return the oldest and newest stored timestamps for a model, (None, None) if empty"""
+    with get_engine().connect() as conn:
+        return tuple(conn.execute(select(func.min(model.timestamp), func.max(model.timestamp))).one())
+
+@stage('db_read', 'database')
+def get_price_table_stats(before=None):
+    """(row count, oldest timestamp) of bitcoin_prices, counting only rows older than before if given"""
+    table = BitcoinPrice.__table__
+    rows = select(func.count()).select_from(table)
+    if before is not None:
+        rows = rows.where(table.c.timestamp < before)
+    with get_engine().connect() as conn:
+        return conn.execute(rows).scalar(), conn.execute(select(func.min(table.c.timestamp))).scalar()
+
+@stage('db_read', 'database')
+def get_data_version(model):
+    """Cheap fingerprint of a table's contents: its write counter, last write time and newest timestamp
+
+    All three are single-row lookups (the counter row by primary key,
+    max(timestamp) from its index), so a conditional GET never scans the
+    table. The counter changes on every upsert, including in-place updates
+    of a forming bar, whose timestamp stays the same; last_modified is the
+    time of that write, or None if the table has not been written since the
+    counter was introduced.
+    """
+    table = model.__table__
+    versions = TableVersion.__table__
+    with get_engine().connect() as conn:
+        newest = conn.execute(select(func.max(table.c.timestamp))).scalar()
+        row = conn.execute(
+            select(versions.c.version, versions.c.updated_at).where(versions.c.table_name == table.name)
+        ).one_or_none()
+    version, updated_at = row if row is not None else (0, None)
+    return {
+        'version': version,
+        'newest': newest,
+        'last_modified': updated_at,
+    }
+
+# Bar columns in the order load_bitcoin_prices / iter_bitcoin_prices return them
+PRICE_COLUMNS = ['Date', 'Open', 'High', 'Low', 'Close', 'Volume']
+
+def _bitcoin_price_query(start=None, end=None, after=None):
+    query = select(
+        BitcoinPrice.timestamp,
+        BitcoinPrice.open_price,
+        BitcoinPrice.high_price,
+        BitcoinPrice.low_price,
+        BitcoinPrice.close_price,
+        BitcoinPrice.volume
+    ).order_by(BitcoinPrice.timestamp)
+    if start is not None:
+        query = query.where(BitcoinPrice.timestamp >= start)
+    if end is not None:
+        query = query.where(BitcoinPrice.timestamp <= end)
+    if after is not None:
+        query = query.where(BitcoinPrice.timestamp > after)
+    return query
+
+@stage('db_read', 'database')
+def load_bitcoin_prices(start=None, end=None):
+    """Load stored Bitcoin bars as an OHLCV DataFrame indexed by UTC timestamp"""
+    with get_engine().connect() as conn:
+        rows = conn.execute(_bitcoin_price_query(start, end)).all()
+
+    df = pd.DataFrame(rows, columns=PRICE_COLUMNS)
+    df['Date'] = pd.to_datetime(df['Date']).dt.tz_localize('UTC')
+    return df.set_index('Date')
+
+def iter_bitcoin_prices(start=None, end=None, after=None, batch_size=1000):
+    """Yield stored Bitcoin bars as lists of row tuples, batch_size rows at a time
+
+    Batches are read with keyset pagination on timestamp, so each query is an
+    index range scan and memory use does not grow with the size of the range.
+    """
+    while True:
+        with get_engine().connect() as conn:
+            rows = conn.execute(_bitcoin_price_query(start, end, after).limit(batch_size)).all()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < batch_size:
+            return
+        after = rows[-1][0]
+
+@stage('db_read', 'database')
+def load_etf_history(symbol, start=None):
+    """Load stored ETF bars for a symbol as a Close/Volume DataFrame indexed by UTC timestamp"""
+    query = select(ETFData.timestamp, ETFData.price, ETFData.volume).where(
+        ETFData.symbol == symbol
+    ).order_by(ETFData.timestamp)
+    if start is not None:
+        query = query.where(ETFData.timestamp >= start)
+
+    with get_engine().connect() as conn:
+        rows = conn.execute(query).all()
+
+    df = pd.DataFrame(rows, columns=['Date', 'Close', 'Volume'])
+    df['Date'] = pd.to_datetime(df['Date']).dt.tz_localize('UTC')
+    return df.set_index('Date')
+
+@stage('db_read', 'database')
+def load_onchain_metrics(start=None):
+    """Load stored on-chain metrics as a DataFrame indexed by timestamp"""
+    query = select(
+        OnchainMetric.timestamp,
+        OnchainMetric.active_addresses,
+        OnchainMetric.transaction_volume,
+        OnchainMetric.hash_rate
+    ).order_by(OnchainMetric.timestamp)
+    if start is not None:
+        query = query.where(OnchainMetric.timestamp >= start)
+
+    with get_engine().connect() as conn:
+        rows = conn.execute(query).all()
+
+    df = pd.DataFrame(rows, columns=['timestamp', 'active_addresses', 'transaction_volume', 'hash_rate'])
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    return df.set_index('timestamp')
+
+def compact_onchain_metrics():
+    """Collapse on-chain metrics to one row per day, stamped at midnight
+
+    Older versions stored a fresh year of rows, timestamped at the time of
+    the request, on every call. For each day the newest of those rows is
+    kept. Returns the number of rows removed; tables that already hold one
+    row per day are left untouched.
+    """
+    day = func.date(OnchainMetric.timestamp)
+    with get_engine().connect() as conn:
+        rows, days = conn.execute(select(func.count(), func.count(day.distinct()))).one()
+        if rows == days:
+            return 0
+        stored = pd.DataFrame(
+            conn.execute(select(OnchainMetric.id, OnchainMetric.timestamp)).all(),
+            columns=['id', 'timestamp']
+        )
+    stored['timestamp'] = pd.to_datetime(stored['timestamp'])
+    stored['day'] = stored['timestamp'].dt.normalize()
+
+    keep = stored.loc[stored.groupby('day')['timestamp'].idxmax()]
+    drop = stored.loc[~stored['id'].isin(keep['id']), 'id'].tolist()
+    moved = keep[keep['timestamp'] != keep['day']]
+    table = OnchainMetric.__table__
+    with get_engine().begin() as conn:
+        for offset in range(0, len(drop), UPSERT_CHUNK_SIZE):
+            conn.execute(delete(table).where(table.c.id.in_(drop[offset:offset + UPSERT_CHUNK_SIZE])))
+        if not moved.empty:
+            # Other rows of each day are gone, so the midnight timestamps are free
+            conn.execute(
+                update(table).where(table.c.id == bindparam('row_id')).values(timestamp=bindparam('day')),
+                [{'row_id': int(row.id), 'day': row.day.to_pydatetime()} for row in moved.itertuples()]
+            )
+        conn.execute(delete(OnchainRollup.__table__))
+        _bump_version(conn, table.name)
+    _rebuild_rollups_for('onchain', OnchainMetric)
+    logging.info(f"Compacted on-chain metrics: removed {len(drop)} rows, {len(keep)} days kept")
+    return len(drop)
+
+# Rollup resolutions from finest to coarsest. A resolution is only maintained
+# for sources whose bars are strictly finer than it, so daily bars get 1w rollups only.
+ROLLUP_RESOLUTIONS = {
+    '1m': pd.Timedelta(minutes=1),
+    '1h': pd.Timedelta(hours=1),
+    '1d': pd.Timedelta(days=1),
+    '1w': pd.Timedelta(days=7),
+}
+BITCOIN_SYMBOL = 'BTC'
+ROLLUP_REBUILD_CHUNK = pd.Timedelta(days=90)
+# Newest bars sampled to estimate a source's bar spacing
+SPACING_SAMPLE = 50
+
+def _bucket_starts(timestamps, resolution):
+    """Start of the bucket each timestamp falls in; weeks start on Monday"""
+    timestamps = pd.DatetimeIndex(timestamps)
+    if resolution == '1w':
+        days = timestamps.floor('D')
+        return days - pd.to_timedelta(days.dayofweek, unit='D')
+    return timestamps.floor(ROLLUP_RESOLUTIONS[resolution])
+
+def _bar_spacing(timestamps):
+    """Typical gap between consecutive bars, or None with fewer than two bars"""
+    if len(timestamps) < 2:
+        return None
+    return pd.Series(pd.DatetimeIndex(timestamps)).diff().abs().median()
+
+def _rollup_window(start, end):
+    """Widen [start, end] to whole buckets at the coarsest resolution"""
+    coarsest = list(ROLLUP_RESOLUTIONS)[-1]
+    return (
+        _bucket_starts([start], coarsest)[0].to_pydatetime(),
+        (_bucket_starts([end], coarsest)[0] + ROLLUP_RESOLUTIONS[coarsest]).to_pydatetime()
+    )
+
+def _source_query(source):
+    """Table and value columns of one rollup source, and its rows as a SELECT"""
+    if source == 'onchain':
+        table = OnchainMetric.__table__
+        columns = [table.c.timestamp, table.c.active_addresses, table.c.transaction_volume, table.c.hash_rate]
+        return table, columns, select(*columns)
+    if source == BITCOIN_SYMBOL:
+        table = BitcoinPrice.__table__
+        columns = [table.c.timestamp, table.c.open_price, table.c.high_price, table.c.low_price,
+                   table.c.close_price, table.c.volume]
+        return table, columns, select(*columns)
+    table = ETFData.__table__
+    # ETF rows carry one price per bar, which serves as every OHLC field
+    columns = [table.c.timestamp, table.c.price, table.c.volume]
+    return table, columns, select(*columns).where(table.c.symbol == source)
+
+def _raw_rows(source, start, end):
+    """Raw rows of one rollup source in [start, end) as a DataFrame"""
+    table, columns, query = _source_query(source)
+    query = query.where(table.c.timestamp >= start, table.c.timestamp < end).order_by(table.c.timestamp)
+    with get_engine().connect() as conn:
+        rows = conn.execute(query).all()
+    return pd.DataFrame(rows, columns=[column.name for column in columns])
+
+def _source_spacing(source):
+    """Bar spacing of one rollup source from its newest rows, or None with fewer than two"""
+    table, _, query = _source_query(source)
+    query = query.with_only_columns(table.c.timestamp).order_by(table.c.timestamp.desc()).limit(SPACING_SAMPLE)
+    with get_engine().connect() as conn:
+        return _bar_spacing(conn.execute(query).scalars().all())
+
+def maintained_resolutions(source):
+    """Rollup resolutions kept for a source: those strictly coarser than its bars"""
+    spacing = _source_spacing(source)
+    if spacing is None:
+        return []
+    return [resolution for resolution, duration in ROLLUP_RESOLUTIONS.items() if duration > spacing]
+
+def _aggregate_rollup(source, frame, resolution):
+    """Rollup rows for every bucket covered by the raw frame"""
+    buckets = _bucket_starts(frame['timestamp'], resolution)
+    grouped = frame.groupby(buckets.to_numpy(), sort=True)
+
+    if source == 'onchain':
+        aggregated = pd.DataFrame({
+            'active_addresses': grouped['active_addresses'].mean(),
+            'transaction_volume': grouped['transaction_volume'].sum(),
+            'hash_rate': grouped['hash_rate'].mean(),
+            'sample_count': grouped.size(),
+        })
+        base = {'resolution': resolution}
+    else:
+        open_column, close_column = ('open_price', 'close_price') if 'open_price' in frame else ('price', 'price')
+        high_column, low_column = ('high_price', 'low_price') if 'high_price' in frame else ('price', 'price')
+        aggregated = pd.DataFrame({
+            'open_price': grouped[open_column].first(),
+            'high_price': grouped[high_column].max(),
+            'low_price': grouped[low_column].min(),
+            'close_price': grouped[close_column].last(),
+            'volume': grouped['volume'].sum(),
+            'bar_count': grouped.size(),
+        })
+        base = {'resolution': resolution, 'symbol': source}
+
+    records = aggregated.reset_index(names='bucket').to_dict('records')
+    for record in records:
+        record['bucket'] = record['bucket'].to_pydatetime()
+        record.update(base)
+    return records
+
+def refresh_rollups(source, start, end):
+    """Recompute the rollup buckets overlapping [start, end] for one source
+
+    source is 'BTC', an ETF symbol or 'onchain'. Each maintained resolution
+    rebuilds only its own buckets that [start, end] touches, from the raw
+    rows they cover, so updated bars are reflected as well as new ones.
+    A source with a single bar has no spacing yet; its buckets are built
+    when the next bar lands.
+    """
+    model = OnchainRollup if source == 'onchain' else PriceRollup
+    written = 0
+    for resolution in maintained_resolutions(source):
+        window_start = _bucket_starts([start], resolution)[0]
+        window_end = _bucket_starts([end], resolution)[0] + ROLLUP_RESOLUTIONS[resolution]
+        frame = _raw_rows(source, window_start.to_pydatetime(), window_end.to_pydatetime())
+        if frame.empty:
+            continue
+        result = bulk_upsert(model, _aggregate_rollup(source, frame, resolution))
+        written += result['inserted'] + result['updated']
+    return written
+
+def _refresh_rollups_for(source, timestamps):
+    """Keep rollups current after a write; failures are logged, not raised"""
+    if len(timestamps) == 0:
+        return
+    try:
+        refresh_rollups(source, min(timestamps), max(timestamps))
+    except Exception as e:
+        logging.error(f"Failed to refresh rollups for {source}: {str(e)}")
+
+def rebuild_rollups():
+    """Build every rollup from the raw tables, a chunk of time at a time"""
+    sources = [(BITCOIN_SYMBOL, BitcoinPrice), ('onchain', OnchainMetric)]
+    with get_engine().connect() as conn:
+        sources += [
+            (symbol, ETFData) for (symbol,) in conn.execute(select(ETFData.symbol).distinct())
+        ]
+
+    for source, model in sources:
+        _rebuild_rollups_for(source, model)
+
+def _rebuild_rollups_for(source, model):
+    oldest, newest = get_timestamp_range(model)
+    if oldest is None:
+        return
+    chunk_start = oldest
+    while chunk_start <= newest:
+        # Chunks end on a coarsest-bucket boundary, which is a boundary at every
+        # resolution, so consecutive chunks never split a bucket
+        chunk_end = _rollup_window(chunk_start, min(chunk_start + ROLLUP_REBUILD_CHUNK, newest))[1]
+        refresh_rollups(source, chunk_start, chunk_end - pd.Timedelta(microseconds=1))
+        chunk_start = chunk_end
+    logging.info(f"Rebuilt rollups for {source}")
+
+def choose_resolution(start, end, max_points, raw_count=None, resolutions=None):
+    """Finest of resolutions whose bucket count over [start, end] fits max_points
+
+    resolutions defaults to all of ROLLUP_RESOLUTIONS; pass
+    maintained_resolutions(source) so a rollup that is never populated for
+    the source is not picked. Returns None when the raw rows (raw_count of
+    them) already fit or no resolution is available, and the coarsest
+    resolution when nothing fits.
+    """
+    if raw_count is not None and raw_count <= max_points:
+        return None
+    resolutions = list(ROLLUP_RESOLUTIONS) if resolutions is None else list(resolutions)
+    if not resolutions:
+        return None
+    span = end - start
+    for resolution in resolutions:
+        if span / ROLLUP_RESOLUTIONS[resolution] + 1 <= max_points:
+            return resolution
+    return resolutions[-1]
+
+def _partial_buckets(symbol, resolution, start, end):
+    """Bars for the parts of buckets that fall in [start, end), aggregated from raw rows
+
+    Each bar is labelled with its first raw timestamp rather than the bucket
+    start, so no bar is dated before start.
+    """
+    frame = _raw_rows(symbol, start, end)
+    if frame.empty:
+        return pd.DataFrame(columns=PRICE_COLUMNS)
+    bars = pd.DataFrame(_aggregate_rollup(symbol, frame, resolution))
+    first = frame.groupby(_bucket_starts(frame['timestamp'], resolution).to_numpy(), sort=True)['timestamp'].first()
+    bars['bucket'] = first.to_numpy()
+    return bars[['bucket', 'open_price', 'high_price', 'low_price', 'close_price', 'volume']].set_axis(PRICE_COLUMNS, axis=1)
+
+@stage('db_read', 'database')
+def load_price_rollup(symbol, resolution, start=None, end=None):
+    """Load rollup bars over [start, end] as an OHLCV DataFrame indexed by UTC bucket start
+
+    Buckets wholly inside the range come from the rollup table. The buckets
+    cut by start or end are re-aggregated from the raw rows inside the
+    range, so no bar from outside [start, end] is included.
+    """
+    table = PriceRollup.__table__
+    query = select(
+        table.c.bucket, table.c.open_price, table.c.high_price,
+        table.c.low_price, table.c.close_price, table.c.volume
+    ).where(table.c.resolution == resolution, table.c.symbol == symbol).order_by(table.c.bucket)
+
+    # Whole buckets are those in [first_whole, after_whole)
+    first_whole = after_whole = None
+    if start is not None:
+        first_whole = _bucket_starts([start], resolution)[0]
+        if first_whole < pd.Timestamp(start):
+            first_whole += ROLLUP_RESOLUTIONS[resolution]
+        query = query.where(table.c.bucket >= first_whole.to_pydatetime())
+    if end is not None:
+        # The bucket holding end may have rows after it, so it is never whole
+        after_whole = _bucket_starts([end], resolution)[0]
+        query = query.where(table.c.bucket < after_whole.to_pydatetime())
+
+    with get_engine().connect() as conn:
+        parts = [pd.DataFrame(conn.execute(query).all(), columns=PRICE_COLUMNS)]
+
+    end_exclusive = pd.Timestamp(end) + pd.Timedelta(microseconds=1) if end is not None else None
+    if first_whole is not None and pd.Timestamp(start) < first_whole:
+        head_end = first_whole if end_exclusive is None else min(first_whole, end_exclusive)
+        parts.insert(0, _partial_buckets(symbol, resolution, start, head_end.to_pydatetime()))
+    if after_whole is not None:
+        tail_start = after_whole if first_whole is None else max(after_whole, first_whole)
+        if tail_start < end_exclusive:
+            parts.append(_partial_buckets(symbol, resolution, tail_start.to_pydatetime(), end_exclusive.to_pydatetime()))
+
+    parts = [part for part in parts if not part.empty]
+    df = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=PRICE_COLUMNS)
+    df['Date'] = pd.to_datetime(df['Date']).dt.tz_localize('UTC')
+    return df.set_index('Date')
+
+def load_bitcoin_prices_for_budget(start=None, end=None, max_points=None):
+    """Bitcoin bars over [start, end] from the coarsest source that still fits max_points
+
+    Reads raw bars when they fit, otherwise the finest rollup that does, so a
+    long range reads a few hundred pre-aggregated rows. Returns the frame and
+    the resolution used (None for raw bars); the frame can still exceed
+    max_points when even the coarsest rollup is too fine.
+    """
+    oldest, newest = get_timestamp_range(BitcoinPrice)
+    if oldest is None:
+        return load_bitcoin_prices(start, end), None
+    start = max(start, oldest) if start is not None else oldest
+    end = min(end, newest) if end is not None else newest
+
+    with get_engine().connect() as conn:
+        raw_count = conn.execute(
+            select(func.count()).where(BitcoinPrice.timestamp >= start, BitcoinPrice.timestamp <= end)
+        ).scalar()
+    resolution = None
+    if max_points:
+        resolution = choose_resolution(
+            start, end, max_points, raw_count, maintained_resolutions(BITCOIN_SYMBOL)
+        )
+    if resolution is not None:
+        rollup = load_price_rollup(BITCOIN_SYMBOL, resolution, start, end)
+        if not rollup.empty:
+            return rollup, resolution
+    return load_bitcoin_prices(start, end), None
+
+@stage('db_write', 'database')
 def store_bitcoin_price(df):
     """Store Bitcoin price data in the database"""
     if df.empty:
-        return
+        return {"inserted": 0, "updated": 0}
 
-    db = None
     try:
-        db = next(get_db())
-        for index, row in df.iterrows():
-            try:
-                price = BitcoinPrice(
-                    timestamp=index,
-                    open_price=float(row['Open']),
-                    high_price=float(row['High']),
-                    low_price=float(row['Low']),
-                    close_price=float(row['Close']),
-                    volume=float(row['Volume']) if 'Volume' in row else 0.0
-                )
-                db.merge(price)
-            except (ValueError, TypeError) as e:
-                logging.warning(f"Skipping invalid price data: {str(e)}")
-                continue
-        db.commit()
+        records = _frame_to_records({
+            'timestamp': _utc_timestamps(df.index),
+            'open_price': pd.to_numeric(df['Open'], errors='coerce').to_numpy(),
+            'high_price': pd.to_numeric(df['High'], errors='coerce').to_numpy(),
+            'low_price': pd.to_numeric(df['Low'], errors='coerce').to_numpy(),
+            'close_price': pd.to_numeric(df['Close'], errors='coerce').to_numpy(),
+            'volume': pd.to_numeric(df['Volume'], errors='coerce').fillna(0.0).to_numpy()
+                if 'Volume' in df.columns else 0.0
+        }, required=['open_price', 'high_price', 'low_price', 'close_price'])
+        result = bulk_upsert(BitcoinPrice, records)
+        _refresh_rollups_for(BITCOIN_SYMBOL, [record['timestamp'] for record in records])
+        return result
     except Exception as e:
         logging.error(f"Failed to store Bitcoin price data: {str(e)}")
-        if db is not None:
-            db.rollback()
+        return {"inserted": 0, "updated": 0}
 
+@stage('db_write', 'database')
 def store_etf_data(symbol, data):
-    """Store ETF data in the database"""
-    if not data or not data.get('history') or data['history'].empty:
-        return
+    """Store ETF daily bars in the database, one row per symbol and bar"""
+    if not data or data.get('history') is None or data['history'].empty:
+        return {"inserted": 0, "updated": 0}
 
-    db = None
     try:
-        db = next(get_db())
-        timestamp = datetime.now()
-        try:
-            price = float(data['history']['Close'].iloc[-1])
-            volume = float(data['history']['Volume'].iloc[-1])
-            assets = float(data['info'].get('totalAssets', 0))
-        except (ValueError, TypeError):
-            price = 0.0
-            volume = 0.0
-            assets = None
-
-        etf = ETFData(
-            timestamp=timestamp,
-            symbol=symbol,
-            price=price,
-            volume=volume,
-            assets=assets
-        )
-        db.merge(etf)
-        db.commit()
+        history = data['history']
+        assets = data.get('info', {}).get('totalAssets')
+        # Fund assets are a current figure, so only the latest bar carries them
+        assets_column = [None] * len(history)
+        assets_column[-1] = float(assets) if assets is not None else None
+
+        records = _frame_to_records({
+            'timestamp': _utc_timestamps(history.index),
+            'symbol': symbol,
+            'price': pd.to_numeric(history['Close'], errors='coerce').to_numpy(),
+            'volume': pd.to_numeric(history['Volume'], errors='coerce').fillna(0.0).to_numpy(),
+            'assets': assets_column
+        }, required=['price'])
+        result = bulk_upsert(ETFData, records)
+        _refresh_rollups_for(symbol, [record['timestamp'] for record in records])
+        return result
     except Exception as e:
         logging.error(f"Failed to store ETF data: {str(e)}")
-        if db is not None:
-            db.rollback()
+        return {"inserted": 0, "updated": 0}
 
+@stage('db_write', 'database')
 def store_onchain_metrics(metrics_df):
     """Store on-chain metrics in the database"""
     if metrics_df.empty:
-        return
+        return {"inserted": 0, "updated": 0}
 
-    db = None
     try:
-        db = next(get_db())
-        for index, row in metrics_df.iterrows():
-            try:
-                metric = OnchainMetric(
-                    timestamp=index,
-                    active_addresses=int(row['active_addresses']),
-                    transaction_volume=float(row['transaction_volume']),
-                    hash_rate=float(row['hash_rate'])
-                )
-                db.merge(metric)
-            except (ValueError, TypeError) as e:
-                logging.warning(f"Skipping invalid metric data: {str(e)}")
-                continue
-        db.commit()
+        records = _frame_to_records({
+            'timestamp': _utc_timestamps(metrics_df.index),
+            'active_addresses': pd.to_numeric(metrics_df['active_addresses'], errors='coerce').to_numpy(),
+            'transaction_volume': pd.to_numeric(metrics_df['transaction_volume'], errors='coerce').to_numpy(),
+            'hash_rate': pd.to_numeric(metrics_df['hash_rate'], errors='coerce').to_numpy()
+        }, required=['active_addresses', 'transaction_volume', 'hash_rate'])
+        for record in records:
+            record['active_addresses'] = int(record['active_addresses'])
+        result = bulk_upsert(OnchainMetric, records)
+        _refresh_rollups_for('onchain', [record['timestamp'] for record in records])
+        return result
     except Exception as e:
         logging.error(f"Failed to store on-chain metrics: {str(e)}")
-        if db is not None:
-            db.rollback()
-
-# Initialize database on module import
-if not init_db():
-    logging.error("Failed to initialize database. Some features may not work properly.")
\ No newline at end of file
+        return {"inserted": 0, "updated": 0}
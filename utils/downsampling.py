@@ -0,0 +1,88 @@
+"""Downsampling of chart series to a bounded number of points
+
+Line series use largest-triangle-three-buckets (LTTB), which keeps the points
+that define the visual shape. Candlestick series are re-bucketed into coarser
+OHLC bars, so highs and lows survive. Both return the input unchanged when
+it already fits the budget.
+"""
+import numpy as np
+import pandas as pd
+
+# Default plot width and how densely each chart type can usefully draw
+DEFAULT_CHART_WIDTH_PX = 1200
+LINE_POINTS_PER_PX = 2
+CANDLE_PX = 3
+
+
+def line_budget(width_px=DEFAULT_CHART_WIDTH_PX):
+    """Point budget for a line chart of the given width"""
+    return max(3, int(width_px * LINE_POINTS_PER_PX))
+
+
+def candle_budget(width_px=DEFAULT_CHART_WIDTH_PX):
+    """Candle budget for a candlestick chart of the given width"""
+    return max(1, int(width_px // CANDLE_PX))
+
+
+def lttb_indices(x, y, threshold):
+    """Indices of the points LTTB keeps out of (x, y), always including both ends
+
+    The loop runs once per output bucket; the work within a bucket is vectorized.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+    # Interior points split into threshold - 2 buckets; the ends are kept as-is
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        # Average of the next bucket (or the last point) is the third vertex
+        next_start, next_end = end, edges[bucket + 2] if bucket + 2 < len(edges) else n
+        next_x = x[next_start:next_end].mean()
+        next_y = y[next_start:next_end].mean()
+
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(np.nanargmax(areas)) if not np.all(np.isnan(areas)) else start
+        selected[bucket + 1] = previous
+    return selected
+
+
+def downsample_line(df, column, max_points):
+    """Rows of df chosen by LTTB on one column, at most max_points of them"""
+    if max_points is None or len(df) <= max_points:
+        return df
+    index = df.index
+    x = index.asi8 if isinstance(index, pd.DatetimeIndex) else np.arange(len(df))
+    return df.iloc[lttb_indices(x, df[column].to_numpy(dtype='float64'), max_points)]
+
+
+def downsample_ohlc(df, max_points):
+    """Merge consecutive bars into at most max_points OHLC(V) bars
+
+    Each output bar is stamped with the time of its first input bar.
+    """
+    if max_points is None or len(df) <= max_points:
+        return df
+    size = int(np.ceil(len(df) / max_points))
+    starts = np.arange(0, len(df), size)
+    ends = np.append(starts[1:], len(df)) - 1
+
+    bars = {
+        'Open': df['Open'].to_numpy()[starts],
+        'High': np.maximum.reduceat(df['High'].to_numpy(), starts),
+        'Low': np.minimum.reduceat(df['Low'].to_numpy(), starts),
+        'Close': df['Close'].to_numpy()[ends],
+    }
+    if 'Volume' in df.columns:
+        bars['Volume'] = np.add.reduceat(df['Volume'].to_numpy(), starts)
+    return pd.DataFrame(bars, index=df.index[starts])
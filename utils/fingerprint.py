@@ -0,0 +1,18 @@
+"""Cheap content fingerprints for DataFrames, used as cache keys and HTTP validators"""
+import hashlib
+import pandas as pd
+
+
+def frame_fingerprint(df) -> str:
+    """Fingerprint a DataFrame or Series from its shape, index bounds and a content checksum
+
+    The checksum hashes every row in vectorized code, which is far cheaper
+    than whatever work the fingerprint is guarding (rendering, analysis,
+    serialization).
+    """
+    if df is None or len(df) == 0:
+        return "empty"
+    checksum = int(pd.util.hash_pandas_object(df, index=True).sum())
+    columns = tuple(df.columns) if isinstance(df, pd.DataFrame) else (df.name,)
+    key = repr((len(df), columns, df.index[0], df.index[-1], checksum))
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
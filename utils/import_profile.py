@@ -0,0 +1,113 @@
+"""Cold-start import profile and budget check for the web entry points
+
+    python -m utils.import_profile                  # main and api.main
+    python -m utils.import_profile api.main --budget 1.5 --top 25
+
+Each target is imported in a fresh interpreter with ``-X importtime``. The
+report lists the slowest modules by their own import time and the totals
+per top-level package. The command exits non-zero when a target's cold
+import exceeds the budget (IMPORT_TIME_BUDGET seconds), or when it pulls in
+one of DEFERRED_MODULES, which must only load on first use.
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+from collections import defaultdict
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_TARGETS = ('main', 'api.main')
+DEFAULT_BUDGET = float(os.getenv('IMPORT_TIME_BUDGET', '2.5'))  # seconds per target
+
+# Heavy dependencies that must not be imported at startup
+DEFERRED_MODULES = ('yfinance', 'plotly', 'twilio')
+
+
+def profile_import(target, python=sys.executable):
+    """Import target in a fresh interpreter and return its import-time profile
+
+    The result has the total cumulative time in seconds, per-module
+    (name, self seconds, cumulative seconds) entries in import order, and
+    the top-level packages loaded by the end.
+    """
+    code = f"import sys, {target}; print('\\n'.join(sorted(sys.modules)))"
+    completed = subprocess.run(
+        [python, '-X', 'importtime', '-c', code],
+        cwd=PROJECT_ROOT, capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"Importing {target} failed:\n{completed.stderr[-2000:]}")
+
+    modules = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules.append((name.strip(), int(self_us) / 1e6, int(cumulative_us) / 1e6))
+
+    total = next((cumulative for name, _, cumulative in modules if name == target), 0.0)
+    return {
+        'target': target,
+        'total': total,
+        'modules': modules,
+        'packages': sorted({name.split('.')[0] for name in completed.stdout.split()}),
+    }
+
+
+def by_package(modules):
+    """Own import time summed per top-level package, slowest first"""
+    totals = defaultdict(float)
+    for name, self_time, _ in modules:
+        totals[name.split('.')[0]] += self_time
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def check(profile, budget=DEFAULT_BUDGET, deferred=DEFERRED_MODULES):
+    """Budget violations for one profile, as human-readable messages"""
+    failures = []
+    if budget is not None and profile['total'] > budget:
+        failures.append(f"{profile['target']}: cold import took {profile['total']:.2f}s (budget {budget:.2f}s)")
+    for package in sorted(set(deferred) & set(profile['packages'])):
+        failures.append(f"{profile['target']}: imports {package} at startup; it should load on first use")
+    return failures
+
+
+def format_report(profile, top=15):
+    lines = [f"{profile['target']}: {profile['total']:.3f}s cumulative import time", "", "  slowest modules (self time):"]
+    for name, self_time, cumulative in sorted(profile['modules'], key=lambda m: m[1], reverse=True)[:top]:
+        lines.append(f"    {self_time * 1000:8.1f} ms  (cumulative {cumulative * 1000:8.1f} ms)  {name}")
+    lines += ["", "  by package:"]
+    for package, total in by_package(profile['modules'])[:top]:
+        lines.append(f"    {total * 1000:8.1f} ms  {package}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument('targets', nargs='*', default=list(DEFAULT_TARGETS), help="Modules to import")
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET, help="Seconds allowed per target")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per target; the fastest is kept")
+    parser.add_argument('--top', type=int, default=15, help="Modules and packages to list")
+    parser.add_argument('--json', action='store_true', help="Print the profiles as JSON")
+    args = parser.parse_args(argv)
+
+    failures, profiles = [], []
+    for target in args.targets:
+        # Disk cache and CPU noise only ever add time, so the fastest run is the fairest
+        profile = min((profile_import(target) for _ in range(max(1, args.repeat))), key=lambda p: p['total'])
+        profiles.append(profile)
+        failures += check(profile, args.budget)
+        if not args.json:
+            print(format_report(profile, args.top))
+            print()
+
+    if args.json:
+        print(json.dumps(profiles, indent=2))
+    for failure in failures:
+        print(f"FAIL {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,219 @@
+"""Background ingestion of market data, off the request path
+
+Each source is refreshed on its own cadence by a single scheduler thread, so
+request handlers only need to read what has already been persisted. Only one
+process at a time acts as the writer: on PostgreSQL this is enforced with an
+advisory lock, on other backends with a lock file.
+
+Run as a separate worker with ``python -m utils.ingestion`` (and
+INGESTION_MODE=worker for the web processes), or in-process with
+INGESTION_MODE=in_process, which makes the web apps call
+start_background_ingestion() on startup.
+"""
+import os
+import sys
+import heapq
+import random
+import tempfile
+import threading
+import time
+import logging
+from utils.database import get_engine
+from utils import data_fetcher
+
+logger = logging.getLogger(__name__)
+
+# Default refresh cadence per source in seconds; override with INGEST_INTERVAL_<NAME>
+DEFAULT_SCHEDULE = {
+    'bitcoin_price': 60,
+    'bitcoin_history': 3600,
+    'etf_data': 900,
+    'onchain_metrics': 3600,
+}
+DEFAULT_JITTER = 0.1  # +/- fraction of the interval
+
+# Arbitrary application-wide key for pg_try_advisory_lock
+WRITER_LOCK_KEY = 0x42544349
+WRITER_LOCK_FILE = os.path.join(tempfile.gettempdir(), 'bitcoin_analytics_ingestion.lock')
+WRITER_LOCK_RETRY = 30  # seconds between attempts to become the writer
+
+
+def default_sources():
+    """Ingestion jobs for every data source, each forcing an upstream refresh"""
+    return {
+        'bitcoin_price': lambda: data_fetcher.get_bitcoin_data(refresh=True),
+        # Straight to the upstream tail fetch: no TTL check, no reload of the stored year,
+        # and failures reach the scheduler instead of being logged and dropped
+        'bitcoin_history': lambda: data_fetcher._refresh_bitcoin_history('1d'),
+        'etf_data': lambda: data_fetcher.fetch_etf_data(period='1_year', refresh=True),
+        'onchain_metrics': lambda: data_fetcher.fetch_onchain_metrics(refresh=True),
+    }
+
+
+class WriterLock:
+    """Cross-process lock guaranteeing a single ingestion writer"""
+
+    def __init__(self):
+        self._conn = None
+        self._file = None
+
+    def acquire(self):
+        """Try to become the writer without blocking; returns True on success"""
+        engine = get_engine()
+        if engine.dialect.name == 'postgresql':
+            conn = engine.connect()
+            acquired = conn.exec_driver_sql(
+                f"SELECT pg_try_advisory_lock({WRITER_LOCK_KEY})"
+            ).scalar()
+            if acquired:
+                # The lock lives as long as this session, so keep it open
+                self._conn = conn
+            else:
+                conn.close()
+            return bool(acquired)
+
+        import fcntl
+        lock_file = open(WRITER_LOCK_FILE, 'w')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._file = lock_file
+        return True
+
+    def release(self):
+        if self._conn is not None:
+            self._conn.exec_driver_sql(f"SELECT pg_advisory_unlock({WRITER_LOCK_KEY})")
+            self._conn.close()
+            self._conn = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class IngestionScheduler:
+    """Runs each registered source on its own cadence in one background thread"""
+
+    def __init__(self, jitter=DEFAULT_JITTER):
+        self.jitter = jitter
+        self._jobs = {}
+        self._queue = []
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = WriterLock()
+
+    def add_source(self, name, func, interval):
+        """Register func to run every interval seconds"""
+        self._jobs[name] = {'func': func, 'interval': float(interval), 'last_run': None, 'last_error': None}
+
+    def _next_delay(self, interval):
+        return max(0.0, interval * (1 + random.uniform(-self.jitter, self.jitter)))
+
+    def _run_job(self, name):
+        job = self._jobs[name]
+        started = time.monotonic()
+        try:
+            job['func']()
+            job['last_error'] = None
+            logger.info(f"Ingested {name} in {time.monotonic() - started:.2f}s")
+        except Exception as e:
+            job['last_error'] = str(e)
+            logger.error(f"Ingestion of {name} failed: {str(e)}")
+        job['last_run'] = time.time()
+
+    def _wait_for_writer_lock(self):
+        while not self._stop.is_set():
+            if self._lock.acquire():
+                logger.info("Acquired ingestion writer lock")
+                return True
+            logger.info("Another process is ingesting, standing by")
+            self._stop.wait(WRITER_LOCK_RETRY)
+        return False
+
+    def run_forever(self):
+        """Run jobs until stop() is called"""
+        if not self._wait_for_writer_lock():
+            return
+        try:
+            now = time.monotonic()
+            # Spread the first runs over a fraction of each interval
+            self._queue = [
+                (now + random.uniform(0, self.jitter) * job['interval'], name)
+                for name, job in self._jobs.items()
+            ]
+            heapq.heapify(self._queue)
+
+            while self._queue and not self._stop.is_set():
+                due, name = self._queue[0]
+                delay = due - time.monotonic()
+                if delay > 0:
+                    self._stop.wait(delay)
+                    continue
+                heapq.heappop(self._queue)
+                self._run_job(name)
+                heapq.heappush(
+                    self._queue,
+                    (time.monotonic() + self._next_delay(self._jobs[name]['interval']), name)
+                )
+        finally:
+            self._lock.release()
+
+    def start(self):
+        """Start the scheduler in a daemon thread"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run_forever, name='ingestion', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def status(self):
+        """Last run time and error per source"""
+        return {
+            name: {'interval': job['interval'], 'last_run': job['last_run'], 'last_error': job['last_error']}
+            for name, job in self._jobs.items()
+        }
+
+
+def create_scheduler(schedule=None, jitter=DEFAULT_JITTER):
+    """Build a scheduler for the default sources, honouring INGEST_INTERVAL_<NAME> overrides"""
+    schedule = {**DEFAULT_SCHEDULE, **(schedule or {})}
+    scheduler = IngestionScheduler(jitter=jitter)
+    for name, func in default_sources().items():
+        interval = float(os.getenv(f"INGEST_INTERVAL_{name.upper()}", schedule[name]))
+        scheduler.add_source(name, func, interval)
+    return scheduler
+
+
+_scheduler = None
+
+def start_background_ingestion():
+    """Start in-process ingestion and switch request-path fetches to database reads"""
+    global _scheduler
+    data_fetcher.set_upstream_on_request(False)
+    if _scheduler is None:
+        _scheduler = create_scheduler()
+    _scheduler.start()
+    return _scheduler
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+    scheduler = create_scheduler()
+    try:
+        scheduler.run_forever()
+    except KeyboardInterrupt:
+        scheduler.stop()
+
+
+if __name__ == '__main__':
+    main()
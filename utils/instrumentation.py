@@ -0,0 +1,245 @@
+"""Latency histograms per request stage, exported in Prometheus text format
+
+Request middleware in both web apps records the route being served in a
+context variable. Code on the hot paths wraps each stage in stage():
+upstream fetch, database read/write, analytics, chart render and
+serialization. stage() then observes the stage's duration into a histogram
+labelled by route, stage and dependency. render_metrics() produces the
+/metrics payload. There is no dependency on prometheus_client.
+
+A sampling profiler can be attached to a share of requests
+(PROFILE_SAMPLE_RATE) to collect collapsed stacks for flame graphs.
+"""
+import os
+import sys
+import time
+import random
+import bisect
+import threading
+import functools
+import contextvars
+from collections import Counter, deque
+
+# Upper bounds in seconds; chosen to resolve both cache hits and slow upstream calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))  # fraction of requests profiled
+PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL', '0.005'))    # seconds between stack samples
+PROFILE_HISTORY = int(os.getenv('PROFILE_HISTORY', '20'))           # profiles kept for /metrics/profiles
+
+# Route template of the request being served; work outside a request is 'background'
+current_route = contextvars.ContextVar('current_route', default='background')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Histogram:
+    """Cumulative-bucket histogram with a fixed set of label names"""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for labelvalues, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), values[:-1]):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labelvalues, [('le', le)])} {cumulative}")
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {values[-1]}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return "\n".join(lines)
+
+
+class CounterMetric:
+    """Monotonic counter with a fixed set of label names"""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = Counter()
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] += amount
+
+    def values(self):
+        """Current value per label values tuple"""
+        with self._lock:
+            return dict(self._values)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labelvalues, value in sorted(self.values().items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {value}")
+        return "\n".join(lines)
+
+
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', "Time to serve a request, by app, route, method and status",
+    ('app', 'route', 'method', 'status')
+)
+STAGE_DURATION = Histogram(
+    'request_stage_duration_seconds', "Time spent in one stage of serving a request",
+    ('route', 'stage', 'dependency')
+)
+STAGE_ERRORS = CounterMetric(
+    'request_stage_errors_total', "Stages that raised, by route, stage and dependency",
+    ('route', 'stage', 'dependency')
+)
+METRICS = [REQUEST_DURATION, STAGE_DURATION, STAGE_ERRORS]
+
+
+def register(metric):
+    """Add a metric defined elsewhere to the /metrics output"""
+    METRICS.append(metric)
+    return metric
+
+
+def observe_request(app, route, method, status, seconds):
+    REQUEST_DURATION.observe(seconds, app, route, method, str(status))
+
+
+def observe_stage(stage, dependency, seconds, route=None):
+    STAGE_DURATION.observe(seconds, route or current_route.get(), stage, dependency)
+
+
+class stage:
+    """Time a block or function as one request stage
+
+        with stage('db_read', 'database'):
+            ...
+
+        @stage('analytics', 'cpu')
+        def analyze(...):
+            ...
+    """
+
+    def __init__(self, name, dependency='none'):
+        self.name = name
+        self.dependency = dependency
+        self._started = None
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe_stage(self.name, self.dependency, time.perf_counter() - self._started)
+        if exc_type is not None:
+            STAGE_ERRORS.inc(current_route.get(), self.name, self.dependency)
+        return False
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            # A fresh timer per call, so concurrent and nested calls don't share state
+            with stage(self.name, self.dependency):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+def render_metrics():
+    """All metrics in Prometheus text exposition format"""
+    return "\n".join(metric.render() for metric in METRICS) + "\n"
+
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class SamplingProfiler:
+    """Samples thread stacks at a fixed interval and counts collapsed stacks
+
+    Every thread except the sampler is sampled, so requests running at the
+    same time show up in each other's profiles. The output is in the
+    collapsed format that flamegraph.pl and speedscope read.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me:
+                    continue
+                names = []
+                while frame is not None:
+                    code = frame.f_code
+                    names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.stacks[';'.join(reversed(names))] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._sample, name='request-profiler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self
+
+    def collapsed(self):
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+
+_profiles = deque(maxlen=PROFILE_HISTORY)
+
+
+def maybe_start_profiler(sample_rate=None):
+    """Start a profiler for this request with probability PROFILE_SAMPLE_RATE, else None"""
+    rate = PROFILE_SAMPLE_RATE if sample_rate is None else sample_rate
+    if rate <= 0 or random.random() >= rate:
+        return None
+    return SamplingProfiler().start()
+
+
+def finish_profiler(profiler, route, seconds):
+    """Stop a request's profiler and keep its stacks for /metrics/profiles"""
+    if profiler is None:
+        return
+    profiler.stop()
+    _profiles.append({'route': route, 'seconds': seconds, 'samples': profiler.samples, 'collapsed': profiler.collapsed()})
+
+
+def recent_profiles():
+    """Most recent request profiles, newest last, as collapsed-stack text"""
+    return "\n\n".join(
+        f"# route={profile['route']} seconds={profile['seconds']:.4f} samples={profile['samples']}\n{profile['collapsed']}"
+        for profile in list(_profiles)
+    ) + "\n"
@@ -0,0 +1,51 @@
+"""Deferred imports for heavy optional-at-startup dependencies
+
+``yf = lazy_module('yfinance')`` binds a placeholder that imports the real
+module on first attribute access, so importing the web apps does not pay for
+yfinance or plotly until a request needs them. The first load is guarded
+by a lock, because the thread pools may touch a module concurrently.
+Assigning an attribute on the placeholder (for example in a test) shadows
+the module's attribute.
+"""
+import importlib
+import sys
+import threading
+
+
+class LazyModule:
+    """Stand-in for a module that is imported on first use"""
+
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+        self.__dict__['_lock'] = threading.Lock()
+
+    def _load(self):
+        module = self.__dict__['_module']
+        if module is None:
+            with self.__dict__['_lock']:
+                module = self.__dict__['_module']
+                if module is None:
+                    module = importlib.import_module(self.__dict__['_name'])
+                    self.__dict__['_module'] = module
+        return module
+
+    @property
+    def loaded(self):
+        """Whether the underlying module has been imported (by us or anyone else)"""
+        return self.__dict__['_module'] is not None or self.__dict__['_name'] in sys.modules
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        self.__dict__[attr] = value
+
+    def __repr__(self):
+        state = 'loaded' if self.loaded else 'not loaded'
+        return f"<lazy module {self.__dict__['_name']!r} ({state})>"
+
+
+def lazy_module(name):
+    """The module itself if already imported, otherwise a LazyModule for it"""
+    return sys.modules.get(name) or LazyModule(name)
@@ -0,0 +1,329 @@
+"""Market data providers: live Yahoo, record, replay and synthetic
+
+Every upstream price fetch in utils.data_fetcher goes through
+get_provider().history(), which has the same arguments and return shape as
+yfinance's Ticker.history. MARKET_DATA_PROVIDER selects the provider:
+
+    yahoo      live Yahoo Finance (default)
+    record     live Yahoo Finance, also saving every response under MARKET_DATA_DIR
+    replay     serves saved responses with no network, after an injected delay
+               of MARKET_DATA_REPLAY_LATENCY +/- MARKET_DATA_REPLAY_JITTER seconds
+    synthetic  generated bars for any symbol and period; MARKET_DATA_SYNTHETIC_BARS
+               forces the length of period requests for very large histories
+
+Recordings are one CSV per symbol and interval. Recording merges new bars
+into the file, so one session can capture the full history and later
+sessions the latest bars. On replay the recording is moved forward in whole
+days so its last bar falls on today, which keeps start-relative requests
+(the last week of ETF bars, the bars since the newest stored one) returning
+data however old the recording is.
+
+    python -m utils.market_data record [--symbols BTC-USD,BITO] [--period 1y]
+"""
+import os
+import sys
+import time
+import zlib
+import random
+import argparse
+import tempfile
+import threading
+import logging
+import numpy as np
+import pandas as pd
+from utils.lazy import lazy_module
+
+logger = logging.getLogger(__name__)
+
+# yfinance takes most of a second to import; load it on the first upstream fetch
+yf = lazy_module('yfinance')
+
+DEFAULT_DIR = os.getenv(
+    'MARKET_DATA_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'market_data')
+)
+OHLCV_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+# yfinance period and interval strings as pandas offsets
+PERIODS = {
+    '1d': pd.Timedelta(days=1), '5d': pd.Timedelta(days=5), '1mo': pd.Timedelta(days=30),
+    '3mo': pd.Timedelta(days=91), '6mo': pd.Timedelta(days=182), '1y': pd.Timedelta(days=365),
+    '2y': pd.Timedelta(days=730), '5y': pd.Timedelta(days=1826), '10y': pd.Timedelta(days=3652),
+}
+INTERVALS = {
+    '1m': '1min', '2m': '2min', '5m': '5min', '15m': '15min', '30m': '30min',
+    '1h': '1h', '60m': '1h', '1d': '1D', '5d': '5D', '1wk': '7D',
+}
+
+
+def _utc(value):
+    ts = pd.Timestamp(value)
+    return ts.tz_localize('UTC') if ts.tz is None else ts.tz_convert('UTC')
+
+
+def _select(frame, period=None, start=None, end=None):
+    """Bars of frame within a yfinance-style period or start/end window"""
+    if frame.empty:
+        return frame
+    if start is not None:
+        frame = frame[frame.index >= _utc(start)]
+    elif period is not None and period != 'max':
+        frame = frame[frame.index > frame.index[-1] - PERIODS[period]]
+    if end is not None:
+        frame = frame[frame.index < _utc(end)]
+    return frame
+
+
+class MarketDataProvider:
+    """Source of OHLCV bars; history() mirrors yfinance's Ticker.history"""
+
+    name = 'base'
+
+    def history(self, symbol, period=None, interval='1d', start=None, end=None, timeout=None):
+        """Bars as a DataFrame of OHLCV_COLUMNS indexed by tz-aware timestamp"""
+        raise NotImplementedError
+
+
+class YahooProvider(MarketDataProvider):
+    """Live Yahoo Finance through yfinance"""
+
+    name = 'yahoo'
+
+    def history(self, symbol, period=None, interval='1d', start=None, end=None, timeout=None):
+        kwargs = {'interval': interval}
+        for key, value in (('period', period), ('start', start), ('end', end), ('timeout', timeout)):
+            if value is not None:
+                kwargs[key] = value
+        return yf.Ticker(symbol).history(**kwargs)
+
+
+class RecordingStore:
+    """CSV recordings of bars per symbol and interval under one directory"""
+
+    def __init__(self, root=DEFAULT_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def path(self, symbol, interval):
+        return os.path.join(self.root, symbol, f"{interval}.csv")
+
+    def read(self, symbol, interval):
+        """Recorded bars indexed by UTC timestamp, or None if nothing was recorded"""
+        path = self.path(symbol, interval)
+        if not os.path.exists(path):
+            return None
+        frame = pd.read_csv(path, index_col=0)
+        frame.index = pd.DatetimeIndex(pd.to_datetime(frame.index, utc=True), name='Date')
+        return frame
+
+    def write(self, symbol, interval, frame):
+        """Merge bars into the recording, newer values replacing older ones for the same time"""
+        if frame.empty:
+            return
+        bars = frame[[column for column in OHLCV_COLUMNS if column in frame.columns]].copy()
+        bars.index = pd.DatetimeIndex(bars.index).tz_convert('UTC') if bars.index.tz is not None \
+            else pd.DatetimeIndex(bars.index).tz_localize('UTC')
+        path = self.path(symbol, interval)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._lock:
+            existing = self.read(symbol, interval)
+            if existing is not None:
+                bars = pd.concat([existing[~existing.index.isin(bars.index)], bars])
+            bars = bars.sort_index()
+            bars.index.name = 'Date'
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w') as sink:
+                    bars.to_csv(sink, date_format='%Y-%m-%dT%H:%M:%S%z')
+                os.replace(tmp_path, path)
+            except Exception:
+                os.unlink(tmp_path)
+                raise
+
+
+class RecordingProvider(MarketDataProvider):
+    """Passes requests to another provider and records every non-empty response"""
+
+    name = 'record'
+
+    def __init__(self, upstream=None, store=None):
+        self.upstream = upstream or YahooProvider()
+        self.store = store or RecordingStore()
+
+    def history(self, symbol, period=None, interval='1d', start=None, end=None, timeout=None):
+        frame = self.upstream.history(symbol, period=period, interval=interval, start=start, end=end, timeout=timeout)
+        if isinstance(frame, pd.DataFrame) and not frame.empty:
+            try:
+                self.store.write(symbol, interval, frame)
+            except OSError as e:
+                logger.warning(f"Could not record {symbol} {interval}: {str(e)}")
+        return frame
+
+
+class ReplayProvider(MarketDataProvider):
+    """Serves recorded bars with no network access, after an injected delay
+
+    The delay is latency +/- jitter seconds, uniformly distributed. A delay
+    longer than the request's timeout raises TimeoutError after the timeout,
+    as a slow upstream would. Symbols without a recording return an empty
+    frame.
+    """
+
+    name = 'replay'
+
+    def __init__(self, store=None, latency=0.0, jitter=0.0, rebase=True):
+        self.store = store or RecordingStore()
+        self.latency = latency
+        self.jitter = jitter
+        self.rebase = rebase
+        self._frames = {}  # (symbol, interval) -> recorded bars, loaded once
+        self._lock = threading.Lock()
+
+    def _recording(self, symbol, interval):
+        key = (symbol, interval)
+        if key not in self._frames:
+            with self._lock:
+                if key not in self._frames:
+                    frame = self.store.read(symbol, interval)
+                    if frame is None:
+                        frame = pd.DataFrame(columns=OHLCV_COLUMNS, index=pd.DatetimeIndex([], tz='UTC', name='Date'))
+                    elif self.rebase:
+                        shift = pd.Timestamp.now(tz='UTC').normalize() - frame.index[-1].normalize()
+                        frame.index = frame.index + pd.Timedelta(days=max(shift.days, 0))
+                    self._frames[key] = frame
+        return self._frames[key]
+
+    def _delay(self, timeout):
+        delay = max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise TimeoutError(f"Replayed request exceeded its {timeout}s timeout")
+        if delay:
+            time.sleep(delay)
+
+    def history(self, symbol, period=None, interval='1d', start=None, end=None, timeout=None):
+        self._delay(timeout)
+        # Callers convert and add columns in place, so they get their own copy
+        return _select(self._recording(symbol, interval), period, start, end).copy()
+
+
+class SyntheticProvider(MarketDataProvider):
+    """Generated bars for any symbol, period and interval
+
+    Each bar is a function of the symbol and its timestamp only: slow cycles
+    plus per-bar noise from a hash. Overlapping requests therefore agree on
+    every bar they share, and generating n bars is O(n) however far back they
+    go. bars, when set, fixes the length of period requests, so arbitrarily
+    large histories can be generated.
+    """
+
+    name = 'synthetic'
+
+    # (period in days, amplitude of log price) of the slow cycles
+    CYCLES = ((365.0, 0.30), (29.0, 0.10), (6.0, 0.03))
+
+    def __init__(self, bars=None, seed=0):
+        self.bars = bars
+        self.seed = seed
+
+    def _noise(self, seconds, symbol, salt):
+        """Uniform [0, 1) per timestamp, from a multiplicative hash"""
+        key = np.uint64((zlib.crc32(symbol.encode()) << 16) ^ (self.seed << 8) ^ salt)
+        with np.errstate(over='ignore'):
+            mixed = (seconds.astype(np.uint64) ^ key) * np.uint64(0x9E3779B97F4A7C15)
+            mixed ^= mixed >> np.uint64(29)
+            mixed *= np.uint64(0xBF58476D1CE4E5B9)
+        return (mixed >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+    def _close(self, seconds, symbol):
+        days = seconds / 86400.0
+        log_price = np.log(30_000.0 if symbol.startswith('BTC') else 20.0)
+        for offset, (period, amplitude) in enumerate(self.CYCLES):
+            phase = zlib.crc32(f"{symbol}{offset}".encode()) % 360
+            log_price = log_price + amplitude * np.sin(2 * np.pi * days / period + np.radians(phase))
+        return np.exp(log_price + 0.01 * (self._noise(seconds, symbol, 1) - 0.5))
+
+    def history(self, symbol, period=None, interval='1d', start=None, end=None, timeout=None):
+        step = pd.Timedelta(INTERVALS[interval])
+        # end is exclusive, as in yfinance
+        last = pd.Timestamp.now(tz='UTC').floor(step) if end is None else _utc(end).ceil(step) - step
+        if start is not None:
+            count = max(0, (last - _utc(start).ceil(step)) // step + 1)
+        elif self.bars is not None:
+            count = self.bars
+        else:
+            count = max(1, PERIODS.get(period or '1mo', PERIODS['10y']) // step)
+        index = pd.date_range(end=last, periods=count, freq=step, name='Date')
+
+        seconds = index.asi8 // 10**9
+        close = self._close(seconds, symbol)
+        open_ = self._close(seconds - int(step.total_seconds()), symbol)
+        spread = 0.005 * self._noise(seconds, symbol, 2) * close
+        volume_scale = 1e9 if symbol.startswith('BTC') else 1e6
+        return pd.DataFrame({
+            'Open': open_,
+            'High': np.maximum(open_, close) + spread,
+            'Low': np.minimum(open_, close) - spread,
+            'Close': close,
+            'Volume': volume_scale * (0.5 + self._noise(seconds, symbol, 3)),
+        }, index=index)
+
+
+def provider_from_env():
+    """Build the provider named by MARKET_DATA_PROVIDER"""
+    name = os.getenv('MARKET_DATA_PROVIDER', 'yahoo')
+    if name == 'yahoo':
+        return YahooProvider()
+    if name == 'record':
+        return RecordingProvider()
+    if name == 'replay':
+        return ReplayProvider(
+            latency=float(os.getenv('MARKET_DATA_REPLAY_LATENCY', '0')),
+            jitter=float(os.getenv('MARKET_DATA_REPLAY_JITTER', '0')),
+        )
+    if name == 'synthetic':
+        bars = os.getenv('MARKET_DATA_SYNTHETIC_BARS')
+        return SyntheticProvider(bars=int(bars) if bars else None)
+    raise ValueError(f"Unknown MARKET_DATA_PROVIDER: {name}")
+
+
+_provider = None
+_provider_lock = threading.Lock()
+
+def get_provider():
+    """Shared provider instance, built from the environment on first use"""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = provider_from_env()
+    return _provider
+
+def set_provider(provider):
+    """Replace the shared provider (None rebuilds it from the environment); returns the previous one"""
+    global _provider
+    with _provider_lock:
+        previous, _provider = _provider, provider
+    return previous
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record market data for offline replay")
+    commands = parser.add_subparsers(dest='command', required=True)
+    record = commands.add_parser('record', help="Fetch histories from Yahoo and save them")
+    record.add_argument('--symbols', help="Comma-separated symbols (default: BTC-USD and the ETFs)")
+    record.add_argument('--period', default='1y')
+    record.add_argument('--interval', default='1d')
+    args = parser.parse_args(argv)
+
+    from utils.data_fetcher import ETF_SYMBOLS
+    symbols = args.symbols.split(',') if args.symbols else ['BTC-USD'] + ETF_SYMBOLS
+    provider = RecordingProvider()
+    for symbol in symbols:
+        frame = provider.history(symbol, period=args.period, interval=args.interval)
+        print(f"{symbol:<10} {len(frame):>7} bars -> {provider.store.path(symbol, args.interval)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
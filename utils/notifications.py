@@ -0,0 +1,256 @@
+"""Batched, non-blocking delivery of alert notifications
+
+Callers hand messages to a NotificationDispatcher and return immediately.
+A collector thread groups queued messages per recipient over a short window,
+dropping duplicates. A pool of workers then sends each batch as one message
+through a shared transport, with a global rate limit and retries with
+exponential backoff. Transports are pluggable: TwilioTransport for SMS,
+FakeTransport for tests and load runs.
+"""
+import os
+import time
+import queue
+import random
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class TransportError(Exception):
+    """Raised by a transport when a message could not be delivered"""
+
+
+class Transport:
+    """Delivers one message to one recipient and returns a provider message id"""
+
+    def send(self, recipient: str, body: str) -> str:
+        raise NotImplementedError
+
+
+class TwilioTransport(Transport):
+    """SMS through Twilio, reusing one client for every message"""
+
+    def __init__(self, account_sid=None, auth_token=None, from_number=None):
+        self.account_sid = account_sid or os.environ.get('TWILIO_ACCOUNT_SID')
+        self.auth_token = auth_token or os.environ.get('TWILIO_AUTH_TOKEN')
+        self.from_number = from_number or os.environ.get('TWILIO_PHONE_NUMBER')
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def configured(self):
+        return all([self.account_sid, self.auth_token, self.from_number])
+
+    def _get_client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from twilio.rest import Client
+                    self._client = Client(self.account_sid, self.auth_token)
+        return self._client
+
+    def send(self, recipient, body):
+        if not self.configured:
+            raise TransportError("Twilio credentials not configured")
+        message = self._get_client().messages.create(body=body, from_=self.from_number, to=recipient)
+        return message.sid
+
+
+class FakeTransport(Transport):
+    """In-process transport that records messages instead of sending them
+
+    fail_first makes the first N sends raise, to exercise retries; latency
+    adds a per-send delay in seconds.
+    """
+
+    def __init__(self, fail_first=0, latency=0.0):
+        self.sent = []
+        self.fail_first = fail_first
+        self.latency = latency
+        self._lock = threading.Lock()
+
+    def send(self, recipient, body):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            if self.fail_first > 0:
+                self.fail_first -= 1
+                raise TransportError("Simulated delivery failure")
+            self.sent.append((recipient, body))
+            return f"fake-{len(self.sent)}"
+
+
+class _RateLimiter:
+    """Token bucket shared by all workers"""
+
+    def __init__(self, rate_per_second):
+        self.rate = rate_per_second
+        self._tokens = rate_per_second
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class NotificationDispatcher:
+    """Queue, batch, deduplicate and deliver notifications off the caller's thread"""
+
+    def __init__(
+        self,
+        transport=None,
+        workers=4,
+        max_queue=10000,
+        batch_window=0.5,
+        max_batch=10,
+        max_retries=3,
+        backoff=0.5,
+        rate_per_second=10.0
+    ):
+        self.transport = transport or TwilioTransport()
+        self.workers = workers
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._incoming = queue.Queue(maxsize=max_queue)
+        self._outgoing = queue.Queue()
+        self._limiter = _RateLimiter(rate_per_second)
+        self._stop = threading.Event()
+        self._threads = []
+        self._in_flight = 0
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'submitted': 0,
+            'dropped': 0,
+            'deduplicated': 0,
+            'batches_sent': 0,
+            'messages_sent': 0,
+            'retries': 0,
+            'failed': 0,
+        }
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def submit(self, recipient, message):
+        """Queue a message without blocking; returns False if the queue is full"""
+        # Counted before it is queued, so a worker can never settle it first
+        with self._stats_lock:
+            self._in_flight += 1
+        try:
+            self._incoming.put_nowait((recipient, message))
+        except queue.Full:
+            self._settle(1)
+            self._count('dropped')
+            logger.warning(f"Notification queue full, dropping alert for {recipient}")
+            return False
+        with self._stats_lock:
+            self._stats['submitted'] += 1
+        return True
+
+    def _collect(self):
+        """Group incoming messages per recipient and release batches when due"""
+        pending = OrderedDict()  # recipient -> (first queued at, {message: None})
+        while not (self._stop.is_set() and self._incoming.empty() and not pending):
+            timeout = self.batch_window
+            if pending:
+                oldest = next(iter(pending.values()))[0]
+                timeout = max(0.0, oldest + self.batch_window - time.monotonic())
+            try:
+                recipient, message = self._incoming.get(timeout=timeout)
+                started, messages = pending.setdefault(recipient, (time.monotonic(), OrderedDict()))
+                if message in messages:
+                    self._count('deduplicated')
+                    self._settle(1)
+                else:
+                    messages[message] = None
+                if len(messages) >= self.max_batch:
+                    self._outgoing.put((recipient, list(pending.pop(recipient)[1])))
+            except queue.Empty:
+                pass
+
+            now = time.monotonic()
+            flush_all = self._stop.is_set()
+            for recipient in [r for r, (started, _) in pending.items() if flush_all or now - started >= self.batch_window]:
+                self._outgoing.put((recipient, list(pending.pop(recipient)[1])))
+
+        for _ in range(self.workers):
+            self._outgoing.put(None)
+
+    def _deliver(self):
+        while True:
+            batch = self._outgoing.get()
+            if batch is None:
+                return
+            recipient, messages = batch
+            body = "\n".join(messages)
+            for attempt in range(self.max_retries + 1):
+                self._limiter.acquire()
+                try:
+                    self.transport.send(recipient, body)
+                    self._count('batches_sent')
+                    self._count('messages_sent', len(messages))
+                    break
+                except Exception as e:
+                    if attempt == self.max_retries:
+                        self._count('failed', len(messages))
+                        logger.error(f"Failed to send alert to {recipient}: {str(e)}")
+                        break
+                    self._count('retries')
+                    delay = self.backoff * (2 ** attempt)
+                    time.sleep(delay + random.uniform(0, delay / 2))
+            self._settle(len(messages))
+
+    def _settle(self, count):
+        with self._stats_lock:
+            self._in_flight -= count
+
+    def start(self):
+        if self._threads:
+            return self
+        self._stop.clear()
+        self._threads = [threading.Thread(target=self._collect, name='notify-collector', daemon=True)]
+        self._threads += [
+            threading.Thread(target=self._deliver, name=f'notify-worker-{i}', daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def flush(self, timeout=None):
+        """Wait until every submitted message has been sent or given up on"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._stats_lock:
+                if self._in_flight == 0:
+                    return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+
+    def stop(self, timeout=None):
+        """Send what is queued, then stop the threads"""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def stats(self):
+        with self._stats_lock:
+            return {**self._stats, 'queued': self._incoming.qsize(), 'in_flight': self._in_flight}
@@ -0,0 +1,70 @@
+"""Sources of daily on-chain metrics
+
+fetch_onchain_metrics asks the source for the days missing from the
+onchain_metrics table and nothing else. ONCHAIN_SOURCE selects the source:
+
+    simulated  random values in realistic ranges (default; there is no live feed yet)
+
+A source returns one row per requested day with the columns in
+METRIC_COLUMNS, indexed by the days it was given.
+"""
+import os
+import threading
+import numpy as np
+import pandas as pd
+
+METRIC_COLUMNS = ['active_addresses', 'transaction_volume', 'hash_rate']
+
+
+class OnchainSource:
+    """Provider of daily on-chain metrics"""
+
+    name = 'base'
+
+    def metrics(self, days):
+        """Metrics for each day of a DatetimeIndex of naive UTC midnights"""
+        raise NotImplementedError
+
+
+class SimulatedOnchainSource(OnchainSource):
+    """Random daily metrics, drawn independently per day"""
+
+    name = 'simulated'
+
+    def __init__(self, seed=None):
+        self._rng = np.random.default_rng(seed)
+
+    def metrics(self, days):
+        count = len(days)
+        return pd.DataFrame({
+            'active_addresses': self._rng.integers(800000, 1200000, size=count),
+            'transaction_volume': self._rng.integers(200000, 500000, size=count),
+            'hash_rate': self._rng.integers(200, 300, size=count),
+        }, index=pd.DatetimeIndex(days, name='timestamp'))
+
+
+SOURCES = {
+    'simulated': SimulatedOnchainSource,
+}
+
+_source = None
+_source_lock = threading.Lock()
+
+def get_onchain_source():
+    """Shared source instance, built from ONCHAIN_SOURCE on first use"""
+    global _source
+    if _source is None:
+        with _source_lock:
+            if _source is None:
+                name = os.getenv('ONCHAIN_SOURCE', 'simulated')
+                if name not in SOURCES:
+                    raise ValueError(f"Unknown ONCHAIN_SOURCE: {name}")
+                _source = SOURCES[name]()
+    return _source
+
+def set_onchain_source(source):
+    """Replace the shared source (None rebuilds it from the environment); returns the previous one"""
+    global _source
+    with _source_lock:
+        previous, _source = _source, source
+    return previous
@@ -0,0 +1,162 @@
+"""Array-backed order book with depth, spread and execution-cost analytics
+
+Each side is stored as price and size arrays sorted from the best level
+outwards, along with cumulative size and notional. Every query is a
+searchsorted or a slice over those arrays. A query that takes an array of
+sizes or distances answers all of them in one call, so a whole slippage
+curve costs about as much as a single point.
+"""
+import numpy as np
+
+DEFAULT_DEPTH_BPS = (10, 25, 50, 100)
+
+
+class OrderBook:
+    """One book: bids sorted high to low, asks sorted low to high"""
+
+    def __init__(self, bid_prices, bid_sizes, ask_prices, ask_sizes):
+        bid_prices, bid_sizes = np.asarray(bid_prices, dtype='float64'), np.asarray(bid_sizes, dtype='float64')
+        ask_prices, ask_sizes = np.asarray(ask_prices, dtype='float64'), np.asarray(ask_sizes, dtype='float64')
+        if bid_prices.shape != bid_sizes.shape or ask_prices.shape != ask_sizes.shape:
+            raise ValueError("Each side needs one size per price level")
+
+        bid_order = np.argsort(-bid_prices, kind='stable')
+        ask_order = np.argsort(ask_prices, kind='stable')
+        self.bid_prices, self.bid_sizes = bid_prices[bid_order], bid_sizes[bid_order]
+        self.ask_prices, self.ask_sizes = ask_prices[ask_order], ask_sizes[ask_order]
+
+        self.bid_depth = np.cumsum(self.bid_sizes)
+        self.ask_depth = np.cumsum(self.ask_sizes)
+        self._bid_notional = np.cumsum(self.bid_prices * self.bid_sizes)
+        self._ask_notional = np.cumsum(self.ask_prices * self.ask_sizes)
+
+    @classmethod
+    def from_dict(cls, book):
+        """Build from the {'bid_prices', 'bid_volumes', 'ask_prices', 'ask_volumes'} form"""
+        return cls(book['bid_prices'], book['bid_volumes'], book['ask_prices'], book['ask_volumes'])
+
+    def to_dict(self):
+        """Plain lists in the {'bid_prices', 'bid_volumes', 'ask_prices', 'ask_volumes'} form"""
+        return {
+            'bid_prices': self.bid_prices.tolist(),
+            'bid_volumes': self.bid_sizes.tolist(),
+            'ask_prices': self.ask_prices.tolist(),
+            'ask_volumes': self.ask_sizes.tolist()
+        }
+
+    @property
+    def best_bid(self):
+        return float(self.bid_prices[0]) if len(self.bid_prices) else np.nan
+
+    @property
+    def best_ask(self):
+        return float(self.ask_prices[0]) if len(self.ask_prices) else np.nan
+
+    @property
+    def mid(self):
+        return (self.best_bid + self.best_ask) / 2
+
+    @property
+    def spread(self):
+        return self.best_ask - self.best_bid
+
+    @property
+    def spread_bps(self):
+        return self.spread / self.mid * 1e4
+
+    @property
+    def total_bid_size(self):
+        return float(self.bid_depth[-1]) if len(self.bid_depth) else 0.0
+
+    @property
+    def total_ask_size(self):
+        return float(self.ask_depth[-1]) if len(self.ask_depth) else 0.0
+
+    def depth_within(self, bps):
+        """Size resting within bps of the mid on each side; bps may be an array
+
+        Returns (bid sizes, ask sizes) with the same shape as bps.
+        """
+        bps = np.asarray(bps, dtype='float64')
+        mid = self.mid
+        if np.isnan(mid):
+            # No mid without both sides, so nothing is within any distance of it
+            return np.zeros(bps.shape), np.zeros(bps.shape)
+        # Bids are descending, so search their negation to keep searchsorted's ascending contract
+        bid_levels = np.searchsorted(-self.bid_prices, -(mid * (1 - bps / 1e4)), side='right')
+        ask_levels = np.searchsorted(self.ask_prices, mid * (1 + bps / 1e4), side='right')
+        return (
+            np.concatenate(([0.0], self.bid_depth))[bid_levels],
+            np.concatenate(([0.0], self.ask_depth))[ask_levels]
+        )
+
+    def _side(self, side):
+        if side == 'buy':
+            return self.ask_prices, self.ask_depth, self._ask_notional
+        if side == 'sell':
+            return self.bid_prices, self.bid_depth, self._bid_notional
+        raise ValueError(f"Unknown side: {side}")
+
+    def vwap(self, size, side='buy'):
+        """Average fill price for a market order of the given size(s)
+
+        A buy walks the asks and a sell walks the bids. Sizes beyond the
+        book's depth, including any size against an empty side, give NaN.
+        """
+        prices, depth, notional = self._side(side)
+        size = np.asarray(size, dtype='float64')
+        if not len(depth):
+            return np.full(size.shape, np.nan)
+        # Level where each order finishes filling
+        level = np.searchsorted(depth, size, side='left')
+        filled = level < len(depth)
+        level = np.minimum(level, len(depth) - 1)
+
+        before_size = np.where(level > 0, depth[level - 1], 0.0)
+        before_notional = np.where(level > 0, notional[level - 1], 0.0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result = (before_notional + (size - before_size) * prices[level]) / size
+        return np.where(filled & (size > 0), result, np.nan)
+
+    def slippage_bps(self, size, side='buy'):
+        """Cost against the mid of filling the given size(s), in basis points"""
+        average = self.vwap(size, side)
+        direction = 1.0 if side == 'buy' else -1.0
+        return direction * (average / self.mid - 1.0) * 1e4
+
+    def slippage_curve(self, sizes):
+        """Buy and sell slippage in bps for each size"""
+        sizes = np.asarray(sizes, dtype='float64')
+        return {
+            'sizes': sizes,
+            'buy_bps': self.slippage_bps(sizes, 'buy'),
+            'sell_bps': self.slippage_bps(sizes, 'sell')
+        }
+
+    def summary(self, sizes=None, depth_bps=DEFAULT_DEPTH_BPS):
+        """JSON-ready liquidity summary; sizes default to fractions of the thinner side"""
+        if sizes is None:
+            sizes = np.array([0.01, 0.05, 0.1, 0.25, 0.5, 1.0]) * min(self.total_bid_size, self.total_ask_size)
+        bid_depth, ask_depth = self.depth_within(np.asarray(depth_bps, dtype='float64'))
+        curve = self.slippage_curve(sizes)
+        return {
+            'best_bid': _finite(self.best_bid),
+            'best_ask': _finite(self.best_ask),
+            'mid': _finite(self.mid),
+            'spread': _finite(self.spread),
+            'spread_bps': _finite(self.spread_bps),
+            'total_bid_size': self.total_bid_size,
+            'total_ask_size': self.total_ask_size,
+            'depth': {
+                f"{bps:g}": {'bid': float(bid), 'ask': float(ask)}
+                for bps, bid, ask in zip(depth_bps, bid_depth, ask_depth)
+            },
+            'slippage': [
+                {'size': float(size), 'buy_bps': _finite(buy), 'sell_bps': _finite(sell)}
+                for size, buy, sell in zip(curve['sizes'], curve['buy_bps'], curve['sell_bps'])
+            ]
+        }
+
+
+def _finite(value):
+    return float(value) if np.isfinite(value) else None
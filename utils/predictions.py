@@ -1,45 +1,84 @@
 import pandas as pd
 import numpy as np
 import json
+from utils.instrumentation import stage
+from utils.indicators import (
+    compute_price_indicators, compute_onchain_indicators, latest_values, RSI_PERIOD
+)
 
+def _score_signals(indicators: dict, close: float) -> tuple:
+    """Turn the latest indicator values into a trend score and the factors behind it"""
+    score = 0
+    factors = []
+
+    sma_long = indicators.get('sma_30')
+    if sma_long is not None:
+        above = close > sma_long
+        score += 1 if above else -1
+        factors.append("Price above 30-day average" if above else "Price below 30-day average")
+
+    ema_short, ema_long = indicators.get('ema_7'), indicators.get('ema_30')
+    if ema_short is not None and ema_long is not None:
+        score += 1 if ema_short > ema_long else -1
+
+    macd_hist = indicators.get('macd_hist')
+    if macd_hist is not None:
+        score += 1 if macd_hist > 0 else -1
+        factors.append("Positive MACD momentum" if macd_hist > 0 else "Negative MACD momentum")
+
+    rsi = indicators.get(f'rsi_{RSI_PERIOD}')
+    if rsi is not None:
+        if rsi > 70:
+            score -= 1
+            factors.append("Overbought RSI")
+        elif rsi < 30:
+            score += 1
+            factors.append("Oversold RSI")
+
+    volatility = indicators.get('volatility_30')
+    if volatility is not None and volatility > 0.6:
+        factors.append("Elevated volatility")
+
+    return score, factors
+
+@stage('analytics', 'cpu')
 def analyze_market_trends(price_data: pd.DataFrame, onchain_data: pd.DataFrame) -> str:
-    """Analyze market trends using price and on-chain data"""
+    """Analyze market trends using technical indicators over price and on-chain data"""
     try:
-        # Calculate basic trends
-        price_change = price_data['Close'].pct_change().mean()
-        volume_trend = price_data['Volume'].pct_change().mean()
-        avg_volume = price_data['Volume'].mean()
-        volume_change = (price_data['Volume'].mean() - price_data['Volume'].shift(7).mean()) / price_data['Volume'].shift(7).mean() * 100
+        price_indicators = latest_values(compute_price_indicators(price_data))
+        onchain_indicators = (
+            latest_values(compute_onchain_indicators(onchain_data)) if not onchain_data.empty else {}
+        )
+
+        # Volume over the last week against the week before
+        volume = price_data['Volume']
+        avg_volume = volume.iloc[-7:].mean()
+        previous_volume = volume.iloc[-14:-7].mean()
+        volume_change = (avg_volume - previous_volume) / previous_volume * 100 if previous_volume else 0.0
 
         # Determine market sentiment
-        if price_change > 0.02 and volume_trend > 0:
+        score, factors = _score_signals(price_indicators, float(price_data['Close'].iloc[-1]))
+        if score >= 2:
             sentiment = "bullish"
-            confidence_score = min(0.5 + abs(price_change), 0.95)
-        elif price_change < -0.02:
+        elif score <= -2:
             sentiment = "bearish"
-            confidence_score = min(0.5 + abs(price_change), 0.95)
         else:
             sentiment = "neutral"
-            confidence_score = 0.5
+        confidence_score = min(0.5 + abs(score) / 8, 0.95)
 
         # Generate prediction
         prediction = {
-            "price_direction": "up" if price_change > 0 else "down",
+            "price_direction": "up" if score > 0 else "down" if score < 0 else "neutral",
             "confidence": confidence_score
         }
 
         # Key factors affecting the market
-        factors = []
-        if not onchain_data.empty:
-            active_addr_trend = onchain_data['active_addresses'].pct_change().mean()
-            hash_rate_trend = onchain_data['hash_rate'].pct_change().mean()
-
-            if active_addr_trend > 0:
-                factors.append("Increasing network activity")
-            if hash_rate_trend > 0:
-                factors.append("Growing network security")
-            if volume_trend > 0:
-                factors.append("Rising trading volume")
+        if (onchain_indicators.get('active_addresses_growth_30') or 0) > 0:
+            factors.append("Increasing network activity")
+        if (onchain_indicators.get('hash_rate_growth_30') or 0) > 0:
+            factors.append("Growing network security")
+        if volume_change > 0:
+            factors.append("Rising trading volume")
 
         analysis = {
             "market_sentiment": sentiment,
@@ -64,12 +103,18 @@ def analyze_market_trends(price_data: pd.DataFrame, onchain_data: pd.DataFrame)
                 ]
             },
             "volume_analysis": {
-                "avg_7day": avg_volume,
-                "volume_change": volume_change
+                "avg_7day": float(avg_volume),
+                "volume_change": float(volume_change)
+            },
+            "indicators": {
+                "price": price_indicators,
+                "onchain": onchain_indicators
             },
             "supporting_metrics": [
-                "Price momentum",
-                "Volume trend",
+                "Moving averages (SMA/EMA)",
+                "MACD and RSI momentum",
+                "Bollinger bands and ATR",
+                "Volume trend (OBV)",
                 "Network activity"
             ],
             "outlook": {
@@ -0,0 +1,83 @@
+"""Time-range reads over the stored tables, straight into column arrays
+
+get_range selects only the requested columns, ordered by time, with an
+index-friendly predicate: (symbol, time) on per-symbol tables and time
+alone on the others. Rows come from the DBAPI cursor as plain tuples and
+go straight into a DataFrame. No ORM objects or SQLAlchemy Row wrappers are
+built, so the cost stays close to the database's own scan as tables grow.
+"""
+import pandas as pd
+from sqlalchemy import select
+
+from utils import database
+from utils.instrumentation import stage
+
+# Columns get_range returns when none are requested
+DEFAULT_COLUMNS = {
+    database.BitcoinPrice: ['open_price', 'high_price', 'low_price', 'close_price', 'volume'],
+    database.ETFData: ['price', 'volume'],
+    database.OnchainMetric: ['active_addresses', 'transaction_volume', 'hash_rate'],
+    database.PriceRollup: ['open_price', 'high_price', 'low_price', 'close_price', 'volume'],
+    database.OnchainRollup: ['active_addresses', 'transaction_volume', 'hash_rate'],
+}
+
+
+def _time_column(table):
+    return table.c.bucket if 'bucket' in table.c else table.c.timestamp
+
+
+def range_query(model, symbol=None, start=None, end=None, columns=None, limit=None, newest_first=False,
+                resolution=None):
+    """SELECT for get_range: the time column followed by the requested columns"""
+    table = model.__table__
+    time_column = _time_column(table)
+    names = list(columns) if columns is not None else DEFAULT_COLUMNS[model]
+    unknown = [name for name in names if name not in table.c]
+    if unknown:
+        raise ValueError(f"Unknown columns for {table.name}: {', '.join(unknown)}")
+
+    query = select(time_column, *[table.c[name] for name in names])
+    if 'symbol' in table.c:
+        if symbol is None:
+            raise ValueError(f"{table.name} reads need a symbol")
+        query = query.where(table.c.symbol == symbol)
+    elif symbol is not None:
+        raise ValueError(f"{table.name} has no symbol column")
+    if 'resolution' in table.c:
+        # Every resolution shares the table, so reads without one would interleave them
+        if resolution is None:
+            raise ValueError(f"{table.name} reads need a resolution")
+        query = query.where(table.c.resolution == resolution)
+    elif resolution is not None:
+        raise ValueError(f"{table.name} has no resolution column")
+    if start is not None:
+        query = query.where(time_column >= start)
+    if end is not None:
+        query = query.where(time_column <= end)
+
+    query = query.order_by(time_column.desc() if newest_first else time_column)
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+
+@stage('db_read', 'database')
+def get_range(model, symbol=None, start=None, end=None, columns=None, limit=None, newest_first=False, resolution=None):
+    """Rows of model between start and end (inclusive) as a DataFrame indexed by UTC time
+
+    symbol is required for per-symbol tables (ETFData, PriceRollup) and not
+    allowed for the others. resolution is required for rollup tables and
+    selects the rollup level. limit with newest_first=True reads the latest rows, still returned
+    newest first.
+    """
+    query = range_query(model, symbol, start, end, columns, limit, newest_first, resolution)
+
+    with database.get_engine().connect() as conn:
+        # The DBAPI cursor yields bare tuples; no Row objects are built per row
+        rows = conn.execute(query).cursor.fetchall()
+
+    names = [column.name for column in query.selected_columns]
+    frame = pd.DataFrame.from_records(rows, columns=names, coerce_float=True)
+    # SQLite hands DateTime back as text, PostgreSQL as datetimes; both parse here
+    frame.index = pd.DatetimeIndex(pd.to_datetime(frame.pop(names[0])), name=names[0]).tz_localize('UTC')
+    return frame
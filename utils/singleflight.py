@@ -0,0 +1,139 @@
+"""Single-flight coalescing of concurrent identical calls
+
+While a call for a key is in flight, later callers with the same key wait
+for it and get its result (or its exception) instead of starting their
+own. The next call after it finishes runs again. Nothing is cached.
+
+Threads coalesce through SingleFlight.do(), asyncio tasks on one event
+loop through SingleFlight.do_async(). The @single_flight decorator keys a
+function's calls by (function name, *key(args)) and both paths use the
+same key, so the web apps share one upstream fetch per key whether the
+callers are Flask worker threads or FastAPI tasks.
+
+Every caller of a coalesced call gets the same result object and must not
+modify it.
+"""
+import asyncio
+import functools
+import threading
+
+from utils.instrumentation import CounterMetric, register
+
+COALESCED_CALLS = register(CounterMetric(
+    'singleflight_calls_total',
+    "Calls to single-flight functions, by whether they ran (leader) or joined an in-flight call (coalesced)",
+    ('function', 'mode', 'role')
+))
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """In-flight calls by key, for threads and for asyncio tasks"""
+
+    def __init__(self):
+        self._calls = {}  # key -> _Call
+        self._tasks = {}  # (event loop, key) -> asyncio.Task
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _record(key, mode, role):
+        COALESCED_CALLS.inc(key[0] if isinstance(key, tuple) else key, mode, role)
+
+    def do(self, key, func, *args, **kwargs):
+        """Call func, or wait for the call already running under key and share its outcome"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            self._record(key, 'thread', 'coalesced')
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        self._record(key, 'thread', 'leader')
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def do_async(self, key, func, *args, **kwargs):
+        """Await func(*args, **kwargs), or the call already running under key on this loop
+
+        The shared call runs as its own task, so cancelling one waiting
+        caller does not cancel it for the others.
+        """
+        task_key = (asyncio.get_running_loop(), key)
+        task = self._tasks.get(task_key)
+        if task is None:
+            self._record(key, 'async', 'leader')
+            task = asyncio.ensure_future(func(*args, **kwargs))
+            self._tasks[task_key] = task
+            task.add_done_callback(functools.partial(self._task_done, task_key))
+        else:
+            self._record(key, 'async', 'coalesced')
+        return await asyncio.shield(task)
+
+    def _task_done(self, task_key, task):
+        if self._tasks.get(task_key) is task:
+            del self._tasks[task_key]
+        if not task.cancelled():
+            task.exception()  # retrieved here in case every waiter was cancelled
+
+    def in_flight(self):
+        """Number of keys with a call running"""
+        with self._lock:
+            return len(self._calls) + len(self._tasks)
+
+
+_group = SingleFlight()
+
+
+def single_flight(key):
+    """Coalesce concurrent calls of the decorated function that map to the same key
+
+    key(*args, **kwargs) returns the identifying part of a call, such as
+    (symbol, period). The wrapper's flight_key(*args, **kwargs) gives the
+    full key, for coalescing in asyncio with run_coalesced().
+    """
+    def decorate(func):
+        def flight_key(*args, **kwargs):
+            return (func.__name__,) + tuple(key(*args, **kwargs))
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return _group.do(flight_key(*args, **kwargs), func, *args, **kwargs)
+
+        wrapper.flight_key = flight_key
+        return wrapper
+    return decorate
+
+
+async def run_coalesced(key, func, *args, **kwargs):
+    """SingleFlight.do_async on the shared group"""
+    return await _group.do_async(key, func, *args, **kwargs)
+
+
+def singleflight_stats():
+    """Leader and coalesced call counts per function"""
+    stats = {}
+    for (function, mode, role), count in COALESCED_CALLS.values().items():
+        stats.setdefault(function, {'leader': 0, 'coalesced': 0})[role] += count
+    return stats
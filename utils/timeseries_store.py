@@ -0,0 +1,268 @@
+"""Columnar on-disk store for OHLCV history
+
+Bars are kept as Arrow IPC files partitioned by symbol, interval and year:
+
+    <root>/<symbol>/<interval>/<year>.arrow
+
+Readers memory-map the partitions, so several worker processes share the same
+pages through the OS page cache. A range read from a single partition is
+converted to pandas without copying the column data. Writers merge new bars
+into the affected partitions and atomically replace the files.
+
+A full rebuild writes a new set of partitions into a version directory,
+<root>/<symbol>/<interval>/v<n>/, and then atomically points the CURRENT
+file at it, so readers see either the old series or the new one, never a
+mix. Readers that lose a file to the cleanup of an old version retry
+against the current one.
+
+pyarrow is optional (the "store" extra); available() reports whether the store can be used.
+"""
+import os
+import time
+import fcntl
+import shutil
+import tempfile
+import logging
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ROOT = os.getenv(
+    'TIMESERIES_STORE_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'timeseries')
+)
+
+OHLCV_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+CURRENT_FILE = 'CURRENT'
+READ_ATTEMPTS = 3
+
+
+def available():
+    """Whether pyarrow is installed and the store can be used"""
+    return pa is not None
+
+
+def _to_utc_index(index):
+    index = pd.DatetimeIndex(index)
+    return index.tz_localize('UTC') if index.tz is None else index.tz_convert('UTC')
+
+
+def _utc_datetime64(value):
+    """Naive-UTC datetime64 for comparing against stored timestamps"""
+    ts = pd.Timestamp(value)
+    if ts.tz is not None:
+        ts = ts.tz_convert('UTC').tz_localize(None)
+    return ts.to_datetime64()
+
+
+def _prepare(df):
+    """OHLCV columns as float64 on a sorted, unique UTC index"""
+    bars = df[OHLCV_COLUMNS].astype('float64').copy()
+    bars.index = _to_utc_index(bars.index)
+    return bars[~bars.index.duplicated(keep='last')].sort_index()
+
+
+class TimeSeriesStore:
+    """Partitioned Arrow IPC files of OHLCV bars, read through memory maps"""
+
+    def __init__(self, root=DEFAULT_ROOT):
+        self.root = root
+
+    def _dir(self, symbol, interval):
+        """Directory holding the lock, the CURRENT pointer and the versions"""
+        return os.path.join(self.root, symbol, interval)
+
+    def _data_dir(self, symbol, interval):
+        """Directory of the partitions currently served"""
+        directory = self._dir(symbol, interval)
+        try:
+            with open(os.path.join(directory, CURRENT_FILE)) as pointer:
+                return os.path.join(directory, pointer.read().strip())
+        except FileNotFoundError:
+            # Never rebuilt: partitions live directly in the interval directory
+            return directory
+
+    @staticmethod
+    def _partitions(directory):
+        if not os.path.isdir(directory):
+            return []
+        return sorted(
+            int(name[:-len('.arrow')]) for name in os.listdir(directory)
+            if name.endswith('.arrow')
+        )
+
+    @staticmethod
+    def _path(directory, year):
+        return os.path.join(directory, f"{year}.arrow")
+
+    def _lock(self, symbol, interval):
+        directory = self._dir(symbol, interval)
+        os.makedirs(directory, exist_ok=True)
+        lock_file = open(os.path.join(directory, '.lock'), 'w')
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return lock_file
+
+    def _load(self, symbol, interval, select_years):
+        """[(year, table)] of the partitions select_years picks, all from one version"""
+        for attempt in range(READ_ATTEMPTS):
+            directory = self._data_dir(symbol, interval)
+            try:
+                loaded = [
+                    (year, self._read_table(self._path(directory, year)))
+                    for year in select_years(self._partitions(directory))
+                ]
+            except FileNotFoundError:
+                loaded = None
+            # Old versions are only removed after CURRENT moves on, so an
+            # unchanged pointer means nothing was listed mid-cleanup
+            if loaded is not None and self._data_dir(symbol, interval) == directory:
+                return loaded
+            if attempt == READ_ATTEMPTS - 1:
+                raise RuntimeError(f"{symbol} {interval} kept changing while being read")
+
+    def _read_table(self, path):
+        with pa.memory_map(path, 'r') as source:
+            return pa.ipc.open_file(source).read_all()
+
+    def _table_to_frame(self, table):
+        # split_blocks keeps each column backed by its Arrow buffer instead of
+        # consolidating into a freshly allocated 2D block
+        df = table.to_pandas(split_blocks=True, self_destruct=False)
+        df = df.set_index('timestamp')
+        df.index.name = 'Date'
+        return df
+
+    def read(self, symbol, interval, start=None, end=None):
+        """Return bars in [start, end] as a DataFrame indexed by UTC timestamp"""
+        start = _utc_datetime64(start) if start is not None else None
+        end = _utc_datetime64(end) if end is not None else None
+
+        def in_range(years):
+            return [
+                year for year in years
+                if (start is None or year >= pd.Timestamp(start).year)
+                and (end is None or year <= pd.Timestamp(end).year)
+            ]
+
+        tables = []
+        for _, table in self._load(symbol, interval, in_range):
+            # Partitions are sorted, so the range is a slice found by binary search
+            timestamps = table.column('timestamp').to_numpy()
+            lo = 0 if start is None else np.searchsorted(timestamps, start, 'left')
+            hi = len(timestamps) if end is None else np.searchsorted(timestamps, end, 'right')
+            if hi > lo:
+                tables.append(table.slice(lo, hi - lo))
+
+        if not tables:
+            return pd.DataFrame(columns=OHLCV_COLUMNS, index=pd.DatetimeIndex([], tz='UTC', name='Date'))
+        table = tables[0] if len(tables) == 1 else pa.concat_tables(tables)
+        return self._table_to_frame(table)
+
+    def latest_timestamp(self, symbol, interval):
+        """Newest stored bar time, or None if nothing is stored"""
+        loaded = self._load(symbol, interval, lambda years: years[-1:])
+        if not loaded or loaded[0][1].num_rows == 0:
+            return None
+        return pd.Timestamp(loaded[0][1].column('timestamp')[-1].as_py())
+
+    def stats(self, symbol, interval):
+        """(row count, oldest timestamp, newest timestamp) of the stored bars; (0, None, None) if none"""
+        count, oldest, newest = 0, None, None
+        for _, table in self._load(symbol, interval, lambda years: years):
+            if table.num_rows == 0:
+                continue
+            count += table.num_rows
+            timestamps = table.column('timestamp')
+            if oldest is None:
+                oldest = pd.Timestamp(timestamps[0].as_py())
+            newest = pd.Timestamp(timestamps[-1].as_py())
+        return count, oldest, newest
+
+    def replace(self, symbol, interval, df):
+        """Replace every stored bar of symbol and interval with df
+
+        The new partitions are written to a fresh version directory and
+        swapped in with one atomic rename of the CURRENT pointer.
+        Returns the number of partitions written.
+        """
+        bars = _prepare(df)
+        directory = self._dir(symbol, interval)
+        with self._lock(symbol, interval):
+            previous = self._data_dir(symbol, interval)
+            version = f"v{time.time_ns()}"
+            os.makedirs(os.path.join(directory, version))
+            for year, year_bars in bars.groupby(bars.index.year):
+                self._write_partition(self._path(os.path.join(directory, version), year), year_bars)
+
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'w') as pointer:
+                pointer.write(version)
+            os.replace(tmp_path, os.path.join(directory, CURRENT_FILE))
+
+            # Readers that already opened old files keep their mappings
+            if previous == directory:
+                for year in self._partitions(previous):
+                    os.unlink(self._path(previous, year))
+            else:
+                shutil.rmtree(previous, ignore_errors=True)
+        return bars.index.year.nunique()
+
+    def write(self, symbol, interval, df):
+        """Merge bars into their year partitions, replacing bars with the same timestamp
+
+        Returns the number of partitions rewritten; unchanged partitions are left alone.
+        """
+        if df.empty:
+            return 0
+
+        bars = _prepare(df)
+        rewritten = 0
+        with self._lock(symbol, interval):
+            directory = self._data_dir(symbol, interval)
+            existing_years = set(self._partitions(directory))
+            for year, new_bars in bars.groupby(bars.index.year):
+                path = self._path(directory, year)
+                if year in existing_years:
+                    existing = self._table_to_frame(self._read_table(path))
+                    merged = pd.concat([existing[~existing.index.isin(new_bars.index)], new_bars]).sort_index()
+                    if merged.equals(existing):
+                        continue
+                else:
+                    merged = new_bars
+                self._write_partition(path, merged)
+                rewritten += 1
+        return rewritten
+
+    def _write_partition(self, path, df):
+        frame = df.reset_index()
+        frame = frame.rename(columns={frame.columns[0]: 'timestamp'})
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            # Readers holding the old file keep their mapping until they reopen
+            os.replace(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+
+_store = None
+
+def get_store():
+    """Shared store instance, or None when pyarrow is not installed"""
+    global _store
+    if not available():
+        return None
+    if _store is None:
+        _store = TimeSeriesStore()
+    return _store
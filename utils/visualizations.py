@@ -1,9 +1,112 @@
-import plotly.graph_objects as go
-import plotly.express as px
+import os
+import threading
+import functools
+from collections import OrderedDict
 import pandas as pd
+from utils.fingerprint import frame_fingerprint
+from utils.downsampling import downsample_line, downsample_ohlc, line_budget, candle_budget
+from utils.lazy import lazy_module
+from utils.instrumentation import stage
 
-def create_price_chart(df):
-    """Create interactive price chart"""
+# plotly is only needed once a chart is rendered
+go = lazy_module('plotly.graph_objects')
+px = lazy_module('plotly.express')
+
+# Upper bound on the total size of cached chart HTML
+RENDER_CACHE_MAX_BYTES = int(os.getenv('RENDER_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+
+class RenderCache:
+    """Size-bounded LRU cache of rendered chart HTML with hit/miss counters"""
+
+    def __init__(self, max_bytes=RENDER_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            html = self._entries.get(key)
+            if html is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return html
+
+    def put(self, key, html):
+        size = len(html)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= len(self._entries.pop(key))
+            self._entries[key] = html
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._entries),
+                'bytes': self._bytes
+            }
+
+_render_cache = RenderCache()
+
+def _fingerprint_arg(value):
+    """Cache key component for a renderer argument"""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return frame_fingerprint(value)
+    if isinstance(value, dict):
+        # ETF data: {symbol: {'history': DataFrame, 'orderbook': {name: [levels]}}}
+        return tuple(sorted((key, _fingerprint_arg(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_fingerprint_arg(item) for item in value)
+    return value
+
+def _memoized_render(func):
+    """Serve a renderer's HTML from the cache while its input data is unchanged"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        key = (
+            func.__name__,
+            tuple(_fingerprint_arg(arg) for arg in args),
+            tuple(sorted((name, _fingerprint_arg(arg)) for name, arg in kwargs.items()))
+        )
+        html = _render_cache.get(key)
+        if html is None:
+            html = func(*args, **kwargs)
+            _render_cache.put(key, html)
+        return html
+    return wrapper
+
+def render_cache_stats():
+    """Hit/miss counters and size of the chart render cache"""
+    return _render_cache.stats()
+
+@stage('chart_render', 'plotly')  # outside the cache, so hits are timed too
+@_memoized_render
+def create_price_chart(df, max_points=None):
+    """Create interactive price chart
+
+    Bars beyond max_points (default: what fits the chart width) are merged
+    into coarser OHLC bars.
+    """
+    df = downsample_ohlc(df, max_points or candle_budget())
     fig = go.Figure()
 
     fig.add_trace(go.Candlestick(
@@ -27,9 +130,15 @@ def create_price_chart(df):
     # Return the full HTML instead of just the div
     return fig.to_html(full_html=False, include_plotlyjs=False)
 
-def create_metric_chart(df, metric_name, color='#F7931A'):
-    """Create metric visualization"""
-    df_plot = df.reset_index()
+@stage('chart_render', 'plotly')  # outside the cache, so hits are timed too
+@_memoized_render
+def create_metric_chart(df, metric_name, color='#F7931A', max_points=None):
+    """Create metric visualization
+
+    Series longer than max_points (default: what fits the chart width) are
+    reduced with LTTB.
+    """
+    df_plot = downsample_line(df, metric_name, max_points or line_budget()).reset_index()
 
     fig = px.line(df_plot, x='timestamp', y=metric_name,
                   title=f'{metric_name.replace("_", " ").title()}')
@@ -43,14 +152,17 @@ def create_metric_chart(df, metric_name, color='#F7931A'):
 
     return fig.to_html(full_html=False, include_plotlyjs=False)
 
-def create_etf_comparison(etf_data):
+@stage('chart_render', 'plotly')  # outside the cache, so hits are timed too
+@_memoized_render
+def create_etf_comparison(etf_data, max_points=None):
     """Create ETF comparison chart"""
     fig = go.Figure()
 
     for etf, data in etf_data.items():
+        history = downsample_line(data['history'], 'Close', max_points or line_budget())
         fig.add_trace(go.Scatter(
-            x=data['history'].index,
-            y=data['history']['Close'],
+            x=history.index,
+            y=history['Close'],
             name=etf,
             mode='lines'
         ))